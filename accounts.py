@@ -0,0 +1,197 @@
+import glob
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import client
+import clock
+import rate
+import outcomes
+import metrics
+import log
+from choose import (
+    load_course_data, wait_for_advance_start, build_headers,
+    submit_course_tasks, save_rate_history,
+)
+from prewarm import Prewarmer
+from watch import SeatWatcher
+from session_guard import SessionGuard
+from targets import TargetSet
+from login import login
+from list import verify_session
+from function import select_batch, ask_schedule
+
+class Account:
+    """
+    多账号模式中的一个账号
+    每个账号有独立的会话(cookies、Authorization)和目录 accounts_dir/学号/，
+    其中保存该账号的session_info.json和selected_courses/课程文件
+    :param entry: 配置中accounts的一项，至少包含username和password，其余配置项覆盖公共配置
+    """
+
+    def __init__(self, entry, root='accounts'):
+        self.entry = entry
+        self.username = str(entry['username'])
+        self.dir = os.path.join(root, self.username)
+        self.session_file = os.path.join(self.dir, 'session_info.json')
+        self.course_dir = os.path.join(self.dir, 'selected_courses')
+        os.makedirs(self.course_dir, exist_ok=True)
+        self.session = client.account_session()
+        self.session_info = None
+
+    def config(self, base):
+        """该账号的配置：公共配置加上账号自己的配置项"""
+        return {**base, **self.entry}
+
+    def course_files(self):
+        return sorted(glob.glob(os.path.join(self.course_dir, '*.json')))
+
+    def load_courses(self):
+        """加载该账号的课程，课程名前加上学号，便于在日志和统计中区分"""
+        course_list = load_course_data(self.course_files())
+        for course in course_list:
+            course['courseName'] = f"{self.username}/{course.get('courseName', '未知课程')}"
+        return course_list
+
+    def save_session(self):
+        with open(self.session_file, 'w', encoding='utf-8') as f:
+            json.dump(self.session_info, f, ensure_ascii=False, indent=2)
+
+    def sign_in(self, config):
+        """恢复保存的会话，失效时重新登录(需要输入验证码)，成功返回True"""
+        client.use_session(self.session)
+        try:
+            if os.path.exists(self.session_file):
+                with open(self.session_file, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                if verify_session(saved, saved.get('batch_id', ''), config.get('campus', '01')):
+                    self.session_info = saved
+                    print(f"[{self.username}] 已恢复保存的会话")
+                    return True
+
+            print(f"\n[{self.username}] 正在登录...")
+            session_info = login(self.config(config))
+            if not session_info:
+                print(f"[{self.username}] 登录失败，跳过该账号")
+                return False
+            client.set_auth(session_info)
+            self.session_info = session_info
+            return True
+        finally:
+            client.use_session(None)
+
+def choose_batch(accounts, config):
+    """所有账号使用同一个批次：优先使用配置的batch_id，其次是已保存会话的批次，否则让用户选择"""
+    if config.get('batch_id'):
+        return config['batch_id']
+    for account in accounts:
+        if account.session_info.get('batch_id'):
+            return account.session_info['batch_id']
+    for account in accounts:
+        if account.session_info.get('batch_list'):
+            return select_batch(account.session_info['batch_list'])
+    return None
+
+def run_accounts(accounts, scheduled_time, config):
+    """
+    在同一个线程池中为所有账号抢课
+    各账号的会话、课程、会话守护和互斥目标相互独立；
+    连接池、发送线程、响应分类表、指标和全局速率上限(rate_budget)由所有账号共用
+    """
+    config['scheduled_time'] = scheduled_time
+    wait_for_advance_start(scheduled_time, config)
+
+    plans = [(account, account.load_courses()) for account in accounts]
+    plans = [(account, course_list) for account, course_list in plans if course_list]
+    if not plans:
+        print("所有账号都没有待抢的课程")
+        return
+
+    senders = max(1, int(config.get('senders_per_course', 1)))
+    total = sum(len(course_list) for _, course_list in plans) * senders
+    print(f"开始多账号选课: {len(plans)} 个账号, 共 {total} 个发送任务, 并发数={config['max_workers']}")
+
+    table = outcomes.create_table(config)
+    log.start(config)
+    meter = metrics.create(config)
+    rate.create_budget(config)
+
+    # 所有账号共用一个连接池，预热一次即可
+    prewarmer = None
+    if scheduled_time and config.get('prewarm', True) and clock.now() < scheduled_time:
+        prewarmer = Prewarmer(min(config['max_workers'], total), interval=config.get('prewarm_interval', 5))
+        prewarmer.start(until=scheduled_time)
+
+    watchers = []
+    all_courses = []
+    all_controllers = []
+    try:
+        with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
+            futures = []
+            for account, course_list in plans:
+                account_config = account.config(config)
+                batch_id = account.session_info.get('batch_id', '')
+                guard = SessionGuard(account_config, account.session_info, session_file=account.session_file)
+                # 互斥只在同一账号内判断
+                targets = TargetSet(course_list)
+                watcher = None
+                if config.get('seat_watch'):
+                    watcher = SeatWatcher(course_list, batch_id, account_config, session=account.session)
+                    watcher.start(start_at=scheduled_time)
+                    watchers.append(watcher)
+                account_futures, controllers = submit_course_tasks(
+                    executor, course_list, build_headers(batch_id), account_config,
+                    watcher, guard, targets, table, session=account.session,
+                )
+                futures.extend(account_futures)
+                all_courses.extend(course_list)
+                all_controllers.extend(controllers)
+
+            for future in futures:
+                future.result()
+    finally:
+        rate.budget = None
+        log.stop()
+        metrics.close(meter)
+        table.report()
+        if prewarmer:
+            prewarmer.stop()
+        for watcher in watchers:
+            watcher.stop()
+        if config.get('adaptive_rate') and all_controllers:
+            save_rate_history(all_courses, all_controllers)
+
+def main(config):
+    """多账号模式入口：依次登录所有账号，然后统一调度抢课"""
+    root = config.get('accounts_dir', 'accounts')
+    accounts = [Account(entry, root) for entry in config.get('accounts', []) if entry.get('username')]
+    print(f"\n多账号模式，共 {len(accounts)} 个账号，课程文件放在 {root}/<学号>/selected_courses/ 下")
+
+    accounts = [account for account in accounts if account.sign_in(config)]
+    if not accounts:
+        print("没有可用的账号，程序结束")
+        return
+
+    batch_id = choose_batch(accounts, config)
+    if not batch_id:
+        print("未选择批次，程序结束")
+        return
+    for account in accounts:
+        account.session_info['batch_id'] = batch_id
+        account.save_session()
+
+    while True:
+        for account in accounts:
+            print(f"[{account.username}] 待抢课程 {len(account.course_files())} 门")
+        if not any(account.course_files() for account in accounts):
+            print("所有账号都没有待抢的课程")
+            return
+
+        scheduled_time, grab_config = ask_schedule(config)
+        print("\n开始自动选课...")
+        run_accounts(accounts, scheduled_time, grab_config)
+
+        if not any(account.course_files() for account in accounts):
+            print("\n所有账号的课程都已成功抢到！")
+            return
+        if input("\n还有未成功的课程, 输入'c'继续尝试，其他键退出: ").lower() != 'c':
+            return
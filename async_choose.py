@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+import client
+import codec
+import clock
+import rate
+import outcomes
+import metrics
+from log import logger
+from choose import AttemptResult, build_course_form, handle_course_response, get_phase_interval
+from session_guard import is_expired
+
+try:
+    import aiohttp
+except ImportError:  # 协程模式为可选功能
+    aiohttp = None
+
+async def send_course_request_async(http, course_data, headers, table=None):
+    """
+    协程版本的选课请求，响应处理与send_course_request一致
+    :return: AttemptResult
+    """
+    course_name = course_data.get('courseName', '未知课程')
+    table = table or outcomes.default_table
+    status = None
+    form = start = None
+    meter = metrics.active
+    if meter:
+        meter.begin(course_name)
+
+    try:
+        form = build_course_form(course_data)
+        start = time.time()
+        async with http.post(
+            client.url('/xsxk/elective/clazz/add'),
+            headers=headers,
+            data=form,
+        ) as response:
+            status = response.status
+            content = await response.read()
+        latency = time.time() - start
+        # aiohttp不经过全局会话的响应钩子，单独记录
+        if client.recorder is not None:
+            client.recorder.record('POST', str(response.url), 'form', form, status, latency,
+                                   content.decode('utf-8', errors='replace'), sent_at=start)
+        # 只解析code和msg
+        res = codec.parse_result(content)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", content.decode('utf-8', errors='replace'))
+        outcome = table.classify(status, res.get('code'), res.get('msg', ''))
+        success = handle_course_response(course_data, res, outcome)
+        result = AttemptResult(success, status, res.get('code'), res.get('msg', ''), latency, outcome)
+    except Exception as e:
+        logger.debug("%s - 请求失败: %s", course_name, e)
+        if client.recorder is not None and start is not None and status is None:
+            # 超时、连接中断等没有响应的请求
+            client.recorder.record('POST', client.url('/xsxk/elective/clazz/add'), 'form', form, None,
+                                   time.time() - start, str(e), sent_at=start, error=type(e).__name__)
+        result = AttemptResult(False, status, None, '', None, table.classify(status, None, ''))
+
+    if meter:
+        meter.end(course_name, result)
+    return result
+
+async def wait_until(target):
+    """
+    协程版本的clock.wait_until：先用asyncio.sleep等到目标前clock.SPIN秒，期间不阻塞事件循环，
+    最后一小段交给clock.wait_until忙等对齐
+    """
+    remaining = target - clock.now() - clock.SPIN
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    clock.wait_until(target)
+
+async def acquire_budget():
+    """从全局速率上限取一个令牌，取不到时让出事件循环等待"""
+    while rate.budget:
+        wait = rate.budget.try_acquire()
+        if not wait:
+            return
+        await asyncio.sleep(wait)
+
+async def prewarm(http, connections, until, interval=5):
+    """
+    协程模式的连接预热，与prewarm.Prewarmer相同：每轮同时发出connections个轻量请求，
+    让aiohttp连接池建立并保持这些长连接，不越过开抢时间until
+    """
+    async def ping():
+        try:
+            async with http.post(
+                client.url("/xsxk/web/now"),
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Referer": client.url("/xsxk/profile/index.html"),
+                },
+            ) as response:
+                await response.read()
+            return True
+        except Exception:
+            return False
+
+    rounds = 0
+    while clock.now() < until:
+        start = time.time()
+        warmed = sum(await asyncio.gather(*(ping() for _ in range(connections))))
+        rounds += 1
+        if rounds == 1:
+            print(f"[预热] 已建立 {warmed}/{connections} 条长连接，耗时 {time.time() - start:.2f}秒")
+        await asyncio.sleep(min(interval, max(until - clock.now(), 0)))
+    print(f"[预热] 结束，共预热 {rounds} 轮")
+
+def sync_auth(http):
+    """把全局会话中最新的cookies和Authorization同步到协程会话"""
+    session = client.get_session()
+    http.headers['Authorization'] = session.headers.get('Authorization', '')
+    http.cookie_jar.update_cookies(session.cookies.get_dict())
+
+async def course_loop(http, semaphore, course_data, headers, config, guard, targets, table, controller=None):
+    """
+    单个课程的请求循环
+    每个间隔发出一个新请求而不等待上一个返回，在途请求数由semaphore统一限制
+    senders_per_course个发送者错开发送等价于把间隔缩短为1/senders_per_course
+    :param controller: 自适应间隔控制器，提供时由它决定请求间隔
+    """
+    course_name = course_data.get('courseName', '未知课程')
+    logger.info("开始选课: %s", course_name)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    pending = set()
+    slow_down = asyncio.Event()  # 服务器繁忙时下一个间隔放慢
+    retry_later_delay = config.get('retry_later_delay', 3)
+    fallback_interval = config.get('fallback_interval', 3)
+    senders = max(1, int(config.get('senders_per_course', 1)))
+    # 互斥目标抢到后停止本课程
+    targets.register(course_data.get('clazzId'), done.set)
+
+    async def attempt():
+        try:
+            version = guard.version
+            result = await send_course_request_async(http, course_data, headers, table)
+            table.record(course_name, result)
+            if controller and not is_expired(result):
+                controller.update(result.latency, result.status, result.code, result.msg)
+            if is_expired(result):
+                # 重新登录是阻塞的网络请求，放到线程中执行，避免阻塞事件循环
+                if await loop.run_in_executor(None, guard.report_expired, version):
+                    sync_auth(http)
+                else:
+                    done.set()
+            elif result.success:
+                done.set()
+                targets.won(course_data.get('clazzId'))
+            elif result.outcome == outcomes.TERMINAL:
+                # 无法选上，停止本课程
+                done.set()
+                targets.give_up(course_data.get('clazzId'), result.msg)
+            elif result.outcome == outcomes.RETRY_LATER:
+                slow_down.set()
+                targets.report_open(course_data.get('clazzId'))
+            elif result.outcome == outcomes.FULL:
+                # 已满时由顺位链中未满的班级接替
+                targets.report_full(course_data.get('clazzId'))
+            else:
+                # 不再已满时恢复原来的顺位
+                targets.report_open(course_data.get('clazzId'))
+        finally:
+            semaphore.release()
+
+    while not done.is_set():
+        phase, interval = get_phase_interval(config, clock.now())
+
+        if phase == 'wait':
+            logger.info("等待提前开始: %.1f秒", interval)
+            await wait_until(clock.now() + interval)
+            continue
+
+        if controller:
+            interval = controller.interval
+        interval /= senders
+
+        if phase == 'advance':
+            logger.debug("[提前开始] %s 间隔: %.2f秒", course_name, interval)
+        elif phase == 'main':
+            logger.debug("[正式开始] %s 间隔: %.2f秒", course_name, interval)
+
+        # 重新登录期间暂停发送
+        if not guard.wait_ready(0):
+            await loop.run_in_executor(None, guard.wait_ready)
+
+        # 所有课程共用的全局速率上限
+        if rate.budget:
+            await acquire_budget()
+        # 达到并发上限时在此等待空闲名额
+        await semaphore.acquire()
+        if done.is_set():
+            semaphore.release()
+            break
+        request = asyncio.create_task(attempt())
+        pending.add(request)
+        request.add_done_callback(pending.discard)
+
+        if slow_down.is_set():
+            slow_down.clear()
+            interval = max(interval, retry_later_delay)
+        # 顺位链中的备选班级低频发送
+        if targets.is_fallback(course_data.get('clazzId')):
+            interval = max(interval, fallback_interval)
+
+        # 根据当前阶段等待，提前阶段精确对齐到预定时间，其余阶段如果选课成功则立即结束
+        if phase == 'advance':
+            await wait_until(min(clock.now() + interval, config['scheduled_time']))
+            continue
+        try:
+            await asyncio.wait_for(done.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+    # 已经结束，取消该课程其余在途请求
+    for request in list(pending):
+        request.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return True
+
+async def _run(course_list, session_info, headers, config, guard, targets, table, controllers):
+    concurrency = int(config.get('async_concurrency', 200))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # 复用全局客户端的公共请求头(含Authorization)和cookies
+    session = client.get_session()
+    base_headers = {k: v for k, v in session.headers.items() if k != 'Connection'}
+    timeout = client.resolve_timeout(config.get('request_timeout'))
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=base_headers,
+        cookies=session.cookies.get_dict(),
+        timeout=aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1]),
+    ) as http:
+        # 提前阶段预热连接，开抢时直接使用已建立的长连接
+        warming = None
+        scheduled_time = config.get('scheduled_time')
+        if scheduled_time and config.get('prewarm', True) and clock.now() < scheduled_time:
+            senders = max(1, int(config.get('senders_per_course', 1)))
+            warming = asyncio.create_task(prewarm(
+                http, min(concurrency, len(course_list) * senders), scheduled_time,
+                interval=config.get('prewarm_interval', 5),
+            ))
+        await asyncio.gather(*(
+            course_loop(http, semaphore, course, headers, config, guard, targets, table, controller)
+            for course, controller in zip(course_list, controllers)
+        ))
+        if warming:
+            warming.cancel()
+            await asyncio.gather(warming, return_exceptions=True)
+
+def run_selected_courses_async(course_list, session_info, headers, config, guard, targets, table, controllers=None):
+    """
+    在单线程事件循环中运行所有课程的选课任务
+    :param controllers: 与course_list一一对应的自适应间隔控制器，未启用时为None
+    """
+    controllers = controllers or [None] * len(course_list)
+    asyncio.run(_run(course_list, session_info, headers, config, guard, targets, table, controllers))
@@ -0,0 +1,452 @@
+"""
+性能基准测试
+用法: python bench.py <测试项> [参数]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from mock_server import make_synthetic_rows
+
+def _timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+def bench_catalog(n_courses, lookups):
+    """对比extract_courses递归扫描与Catalog索引"""
+    from lesson import extract_courses
+    from catalog import Catalog, free_seats
+
+    rows = make_synthetic_rows(n_courses)
+    data = {"code": 200, "data": {"rows": rows, "total": len(rows)}}
+    rng = random.Random(1)
+    all_ids = [c["JXBID"] for r in rows for c in ([r] if "JXBID" in r else r["tcList"])]
+    targets = [rng.choice(all_ids) for _ in range(lookups)]
+    teacher = rows[0].get("SKJS") or rows[0]["tcList"][0]["SKJS"]
+    print(f"模拟课程数: {len(rows)}, 教学班数: {len(all_ids)}, 查找次数: {lookups}")
+
+    # 旧方式：每次显示都递归提取，查找时线性扫描
+    def old_lookup():
+        courses = extract_courses(data)
+        found = 0
+        for jxbid in targets:
+            for course in courses:
+                classes = [course] if "tcList" not in course else course["tcList"]
+                if any(c.get("JXBID") == jxbid for c in classes):
+                    found += 1
+                    break
+        return found
+
+    def old_filter():
+        courses = extract_courses(data)
+        return [
+            c for course in courses
+            for c in ([course] if "tcList" not in course else course["tcList"])
+            if c.get("SKJS") == teacher and free_seats(c) > 0
+        ]
+
+    build_time, catalog = _timed(lambda: Catalog.from_rows(rows), 3)
+    extract_time, _ = _timed(lambda: extract_courses(data), 3)
+    old_lookup_time, old_found = _timed(old_lookup, 1)
+    new_lookup_time, new_found = _timed(lambda: sum(catalog.get_class(j) is not None for j in targets), 1)
+    old_filter_time, old_result = _timed(old_filter, 3)
+    new_filter_time, new_result = _timed(lambda: catalog.query(teacher=teacher, min_free=1), 3)
+    assert old_found == new_found and len(old_result) == len(new_result)
+
+    print(f"extract_courses 递归提取:   {extract_time * 1000:9.2f}ms")
+    print(f"Catalog 构建索引:           {build_time * 1000:9.2f}ms")
+    print(f"按JXBID查找 旧/新:          {old_lookup_time * 1000:9.2f}ms / {new_lookup_time * 1000:.2f}ms")
+    print(f"教师+有余量筛选 旧/新:      {old_filter_time * 1000:9.2f}ms / {new_filter_time * 1000:.2f}ms")
+
+class SlowConsole:
+    """模拟较慢的终端(SSH、Windows控制台)：每次写入耗时固定，同一时间只能有一个线程写入"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if self.delay:
+                time.sleep(self.delay)
+            self.writes += 1
+        return len(text)
+
+    def flush(self):
+        pass
+
+def bench_logging(threads, attempts, delay_ms):
+    """对比每次请求直接print与通过log模块的后台线程输出时，每秒能完成的请求数"""
+    import log
+    from log import logger
+
+    body = json.dumps({"code": 500, "msg": "该课程已满，选课失败", "data": None}, ensure_ascii=False)
+    course_name = "高等数学"
+
+    def old_attempt(_):
+        # 原来每次请求的输出：阶段、完整响应、处理结果
+        print(f"[正式开始] 间隔: {0.5:.2f}秒")
+        print(body)
+        print(f"{course_name} - {'该课程已满，选课失败'}")
+
+    def new_attempt(_):
+        logger.debug("[正式开始] %s 间隔: %.2f秒", course_name, 0.5)
+        logger.debug("%s", body)
+        logger.debug("%s - [%s] %s", course_name, "继续重试", "该课程已满，选课失败")
+
+    def run(name, attempt, config=None):
+        console = SlowConsole(delay_ms / 1000)
+        stdout, sys.stdout = sys.stdout, console
+        try:
+            if config is not None:
+                log.start(config)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(attempt, range(threads * attempts)))
+            elapsed = time.perf_counter() - start
+            if config is not None:
+                log.stop()
+            drained = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+        total = threads * attempts
+        print(f"{name:<28} {total / elapsed:10.0f} 次/秒   发送线程耗时 {elapsed * 1000:8.1f}ms   "
+              f"输出完毕 {drained * 1000:8.1f}ms   控制台写入 {console.writes} 次")
+
+    print(f"线程数: {threads}, 每线程请求数: {attempts}, 每次控制台写入耗时: {delay_ms}ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        run("print", old_attempt)
+        run("log (控制台DEBUG)", new_attempt, {"log_level": "DEBUG", "log_file": ""})
+        run("log (控制台INFO+文件DEBUG)", new_attempt,
+            {"log_level": "INFO", "log_file": os.path.join(tmp, "grab.log")})
+
+def bench_prepare(attempts):
+    """
+    对比每次请求都构建请求(表单编码、合并请求头和cookies、查找代理设置)与发送预先构建的请求时，
+    每次请求的CPU耗时。使用不联网的适配器直接返回固定响应，只统计客户端自身的开销
+    """
+    import requests
+    from requests.adapters import BaseAdapter
+    import client
+    import metrics
+    from choose import build_headers, prepare_course_request, send_course_request
+
+    body = json.dumps({"code": 500, "msg": "该课程已满，选课失败", "data": None}, ensure_ascii=False).encode('utf-8')
+
+    class CannedAdapter(BaseAdapter):
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = body
+            response.headers['Content-Type'] = 'application/json;charset=UTF-8'
+            response.encoding = 'utf-8'
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    client.init_client({'base_url': 'http://bench.invalid'})
+    client.set_auth({
+        'cookies': {'JSESSIONID': 'A' * 32, 'route': 'B' * 32},
+        'Authorization': 'Bearer ' + 'C' * 128,
+    })
+    client.get_session().mount('http://', CannedAdapter())
+    metrics.active = None
+    course = {'clazzId': 'J00000001', 'secretVal': 'S' * 200, 'courseName': '高等数学', 'clazzType': 'TJKC'}
+    headers = build_headers('MOCK-BATCH')
+
+    def run(name, prepared):
+        send_course_request(course, headers, prepared=prepared)
+        start = time.process_time()
+        for _ in range(attempts):
+            send_course_request(course, headers, prepared=prepared)
+        cpu = (time.process_time() - start) / attempts
+        print(f"{name:<16} 每次请求CPU耗时 {cpu * 1e6:8.1f}us")
+        return cpu
+
+    print(f"请求次数: {attempts}")
+    before = run("每次构建", None)
+    after = run("预先构建", prepare_course_request(course, headers))
+    print(f"节省 {(1 - after / before) * 100:.0f}%")
+
+def bench_json(capture=None, pages=20, repeat=20):
+    """
+    对比各JSON库解析课程列表页和选课响应的耗时，以及选课响应只取code和msg的快速路径
+    :param capture: 抓包文件，提供时使用其中记录的clazz/list和clazz/add响应，否则使用生成的数据
+    """
+    import codec
+
+    def encode(payload):
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    if capture:
+        from capture import load_capture
+        entries = [entry for entry in load_capture(capture) if isinstance(entry.get('response'), dict)]
+        list_bodies = [encode(e['response']) for e in entries if e['path'].endswith('/clazz/list')]
+        add_bodies = [encode(e['response']) for e in entries if e['path'].endswith('/clazz/add')]
+    else:
+        rows = make_synthetic_rows(pages * 100)
+        list_bodies = [
+            encode({'code': 200, 'msg': '操作成功', 'data': {'rows': rows[i:i + 100], 'total': len(rows)}})
+            for i in range(0, len(rows), 100)
+        ]
+        add_bodies = [encode({'code': code, 'msg': msg, 'data': None}) for code, msg in (
+            (500, '该课程已满，选课失败'), (500, '本轮次选课暂未开始'), (200, '选课成功'),
+            (500, '请求过于频繁，请稍后再试'),
+        )]
+    if not list_bodies and not add_bodies:
+        print("抓包中没有课程列表或选课响应")
+        return
+
+    def timed(parse, bodies, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for body in bodies:
+                parse(body)
+        return (time.perf_counter() - start) / (rounds * len(bodies))
+
+    def old_add(body):
+        # 原来的路径：response.text解码一次，response.json()再解码并完整解析一次
+        body.decode('utf-8')
+        return json.loads(body.decode('utf-8'))
+
+    backends = codec.available()
+    print(f"已安装的JSON库: {', '.join(backends)}")
+    if list_bodies:
+        size = sum(len(body) for body in list_bodies) / len(list_bodies)
+        print(f"\n课程列表页: {len(list_bodies)} 页, 平均 {size / 1024:.1f}KB")
+        base = timed(json.loads, list_bodies, repeat)
+        for name in backends:
+            cost = timed(lambda body: codec.loads(body, name), list_bodies, repeat)
+            print(f"  {name:<10} 每页 {cost * 1000:8.3f}ms  {size / cost / 1e6:8.1f}MB/s  {base / cost:5.1f}x")
+    if add_bodies:
+        rounds = max(1, 100000 // len(add_bodies))
+        print(f"\n选课响应: {len(add_bodies)} 条")
+        base = timed(old_add, add_bodies, rounds)
+        print(f"  {'text+json':<10} 原来的路径      每次 {base * 1e6:6.2f}us")
+        for name in backends:
+            cost = timed(lambda body: codec.loads(body, name), add_bodies, rounds)
+            print(f"  {name:<10} 完整解析        每次 {cost * 1e6:6.2f}us  {base / cost:5.1f}x")
+            cost = timed(lambda body: codec.parse_result(body, name), add_bodies, rounds)
+            print(f"  {name:<10} 只取code/msg    每次 {cost * 1e6:6.2f}us  {base / cost:5.1f}x")
+
+@contextlib.contextmanager
+def mock_workspace(base_url, config, token='bench'):
+    """
+    在临时目录中准备连接模拟服务器(或回放服务器)的运行环境：初始化客户端并写入session_info.json
+    运行期间屏蔽被测代码的输出
+    """
+    import client
+    from mock_server import BATCH_ID
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            client.init_client({**config, 'base_url': base_url})
+            session_info = {'cookies': {}, 'token': token, 'Authorization': f"Bearer {token}", 'batch_id': BATCH_ID}
+            with open('session_info.json', 'w', encoding='utf-8') as f:
+                json.dump(session_info, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield session_info
+        finally:
+            os.chdir(cwd)
+
+def mock_courses(state, count):
+    """从模拟服务器的课程中各取一个教学班，去掉上课时间避免互斥"""
+    courses = []
+    for row in state.rows[:count]:
+        class_info = row if 'JXBID' in row else row['tcList'][0]
+        courses.append({
+            'clazzId': class_info['JXBID'],
+            'secretVal': class_info['secretVal'],
+            'courseName': row['KCM'],
+            'courseCode': row['KCH'],
+            'teacher': class_info.get('SKJS', ''),
+            'teachingPlace': '',
+            'clazzType': 'FANKC',
+        })
+    return courses
+
+def write_course_files(courses):
+    """把课程信息保存为课程文件，返回文件路径列表"""
+    os.makedirs('selected_courses', exist_ok=True)
+    files = []
+    for course in courses:
+        path = os.path.join('selected_courses', f"{course['clazzId']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(course, f, ensure_ascii=False)
+        files.append(path)
+    return files
+
+def bench_grab(workers_list, senders_list, engines, courses, latency, open_in, interval, capture_file=None):
+    """
+    在模拟服务器上运行run_selected_courses，统计每秒请求数和开放后第一次成功的耗时
+    :param capture_file: 提供时把请求记录到该抓包文件，供replay测试回放
+    """
+    from mock_server import MockServer
+    from choose import run_selected_courses
+
+    print(f"课程数: {courses}, 服务器延迟: {latency * 1000:.0f}ms, 开放前等待: {open_in}秒, 抢课间隔: {interval}秒")
+    print(f"{'引擎':<8}{'并发数':>6}{'每课线程':>8}{'请求数':>8}{'请求/秒':>10}{'首次成功':>12}{'全部成功':>12}")
+    for engine in engines:
+        for workers in workers_list:
+            for senders in senders_list:
+                config = {
+                    'grab_interval': interval, 'max_workers': workers, 'senders_per_course': senders,
+                    'engine': engine, 'metrics_interval': 0, 'log_level': 'WARNING', 'log_file': '',
+                    'capture_file': capture_file and os.path.abspath(capture_file),
+                }
+                with MockServer(latency=latency, capacity=1000, open_at=time.time() + open_in) as server:
+                    with mock_workspace(server.base_url, config, server.state.issue_token()):
+                        files = write_course_files(mock_courses(server.state, courses))
+                        start = time.time()
+                        run_selected_courses(files, None, dict(config))
+                        elapsed = time.time() - start
+                    state = server.state
+                    attempts = state.counts.get('/xsxk/elective/clazz/add', 0)
+                    first = state.first_success_at - state.open_at if state.first_success_at else float('nan')
+                    print(f"{engine:<8}{workers:>9}{senders:>10}{attempts:>11}{attempts / elapsed:>12.1f}"
+                          f"{first * 1000:>13.0f}ms{(start + elapsed - state.open_at) * 1000:>12.0f}ms")
+
+def bench_list(concurrency_list, courses, latency):
+    """在模拟服务器上对比不同并发数下get_course_list的耗时"""
+    from mock_server import MockServer
+    from list import get_course_list
+
+    pages = (courses + 99) // 100
+    print(f"课程数: {courses} ({pages}页), 服务器延迟: {latency * 1000:.0f}ms")
+    with MockServer(latency=latency, courses=courses) as server:
+        for concurrency in concurrency_list:
+            with mock_workspace(server.base_url, {'max_workers': concurrency}, server.state.issue_token()) as session_info:
+                start = time.time()
+                rows = get_course_list(session_info, session_info['batch_id'], concurrency=concurrency)
+                elapsed = time.time() - start
+                assert rows is not None and len(rows) == courses
+            print(f"并发数 {concurrency:>3}: {elapsed * 1000:8.0f}ms")
+
+def bench_replay(path, engines, workers, interval, speed):
+    """
+    回放抓包文件，用当时的服务器响应和耗时重新运行run_selected_courses
+    课程取自记录中的选课请求，只保留最后一次响应会结束抢课(成功、已选上或无法选上)的课程
+    """
+    import outcomes
+    from capture import load_capture
+    from replay import ReplayServer
+    from choose import run_selected_courses
+
+    entries = load_capture(path)
+    adds = [
+        entry for entry in entries
+        if entry['path'].endswith('/clazz/add') and isinstance(entry['body'], dict) and isinstance(entry['response'], dict)
+    ]
+    last = {entry['body'].get('clazzId'): entry for entry in adds}
+    courses = [
+        {**entry['body'], 'courseName': clazz_id, 'teachingPlace': ''}
+        for clazz_id, entry in last.items()
+        if outcomes.default_table.classify(
+            entry['status'], entry['response'].get('code'), entry['response'].get('msg', '')
+        ) in (outcomes.SUCCESS, outcomes.HELD, outcomes.TERMINAL)
+    ]
+    if not courses:
+        print("抓包中没有以成功或失败结束的选课请求，无法回放")
+        return
+    recorded_success = next((entry['t'] for entry in adds if entry['response'].get('code') == 200), None)
+    print(f"记录 {len(entries)} 条, 选课请求 {len(adds)} 次, 回放课程 {len(courses)} 门, 回放速度 {speed}x")
+    if recorded_success is not None:
+        print(f"原始记录: 第一次选课请求后 {(recorded_success - adds[0]['t']) * 1000:.0f}ms 首次成功")
+
+    for engine in engines:
+        config = {
+            'grab_interval': interval, 'max_workers': workers, 'engine': engine,
+            'metrics_interval': 0, 'log_level': 'WARNING', 'log_file': '',
+        }
+        with ReplayServer(entries, speed=speed) as server:
+            with mock_workspace(server.base_url, config):
+                files = write_course_files(courses)
+                start = time.time()
+                run_selected_courses(files, None, dict(config))
+                elapsed = time.time() - start
+            state = server.state
+            attempts = state.counts.get(adds[0]['path'], 0)
+            first = (state.first_success_at - start) * 1000 if state.first_success_at else float('nan')
+            print(f"{engine:<8} 选课请求 {attempts} 次, {attempts / elapsed:.1f} 请求/秒, "
+                  f"首次成功 {first:.0f}ms, 全部结束 {elapsed * 1000:.0f}ms")
+
+def _int_list(text):
+    return [int(item) for item in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    sub = parser.add_subparsers(dest="name", required=True)
+
+    p = sub.add_parser("catalog", help="课程目录索引 vs extract_courses")
+    p.add_argument("--courses", type=int, default=3000)
+    p.add_argument("--lookups", type=int, default=200)
+
+    p = sub.add_parser("logging", help="print vs 后台线程日志")
+    p.add_argument("--threads", type=int, default=15)
+    p.add_argument("--attempts", type=int, default=200, help="每个线程的请求数")
+    p.add_argument("--delay-ms", type=float, default=0.2, help="模拟每次控制台写入的耗时")
+
+    p = sub.add_parser("json", help="各JSON库解析课程列表页和选课响应的耗时")
+    p.add_argument("--capture", help="使用抓包文件中记录的响应")
+    p.add_argument("--pages", type=int, default=20, help="未提供抓包时生成的课程列表页数")
+    p.add_argument("--repeat", type=int, default=20)
+
+    p = sub.add_parser("prepare", help="每次构建请求 vs 预先构建的请求")
+    p.add_argument("--attempts", type=int, default=20000)
+
+    p = sub.add_parser("grab", help="模拟服务器上的抢课吞吐量和首次成功耗时")
+    p.add_argument("--workers", type=_int_list, default=[5, 15], help="并发数，逗号分隔")
+    p.add_argument("--senders", type=_int_list, default=[1, 3], help="每门课程的发送线程数，逗号分隔")
+    p.add_argument("--engines", default="thread", help="引擎，逗号分隔(thread,async)")
+    p.add_argument("--courses", type=int, default=5)
+    p.add_argument("--latency", type=float, default=0.05, help="模拟服务器延迟(秒)")
+    p.add_argument("--open-in", type=float, default=2, help="开始后多少秒开放选课")
+    p.add_argument("--interval", type=float, default=0.2, help="抢课间隔(秒)")
+    p.add_argument("--capture", help="把请求记录到该抓包文件，供replay测试回放")
+
+    p = sub.add_parser("list", help="模拟服务器上不同并发数获取课程列表的耗时")
+    p.add_argument("--concurrency", type=_int_list, default=[1, 2, 4, 8], help="并发数，逗号分隔")
+    p.add_argument("--courses", type=int, default=2000)
+    p.add_argument("--latency", type=float, default=0.1, help="模拟服务器延迟(秒)")
+
+    p = sub.add_parser("replay", help="回放抓包文件，重新运行抢课")
+    p.add_argument("capture", help="抓包文件(capture_file)")
+    p.add_argument("--engines", default="thread", help="引擎，逗号分隔(thread,async)")
+    p.add_argument("--workers", type=int, default=15)
+    p.add_argument("--interval", type=float, default=0.2, help="抢课间隔(秒)")
+    p.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+
+    args = parser.parse_args()
+    if args.name == "catalog":
+        bench_catalog(args.courses, args.lookups)
+    elif args.name == "logging":
+        bench_logging(args.threads, args.attempts, args.delay_ms)
+    elif args.name == "json":
+        bench_json(args.capture, args.pages, args.repeat)
+    elif args.name == "prepare":
+        bench_prepare(args.attempts)
+    elif args.name == "grab":
+        bench_grab(args.workers, args.senders, args.engines.split(','), args.courses,
+                   args.latency, args.open_in, args.interval, args.capture)
+    elif args.name == "list":
+        bench_list(args.concurrency, args.courses, args.latency)
+    elif args.name == "replay":
+        bench_replay(args.capture, args.engines.split(','), args.workers, args.interval, args.speed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import atexit
+import gzip
+import json
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+# 需要脱敏的字段，请求和响应中出现时都替换掉
+REDACTED_FIELDS = ('password', 'token', 'Authorization')
+REDACTED = '<redacted>'
+
+def redact(value):
+    """递归替换字典中的敏感字段"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in REDACTED_FIELDS and item else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+def parse_body(body, content_type=''):
+    """
+    把请求体解析为可记录的形式
+    :return: (类型, 内容)，类型为json、form或None
+    """
+    if body is None or body == '':
+        return None, None
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    if 'json' in (content_type or ''):
+        try:
+            return 'json', json.loads(body)
+        except ValueError:
+            return None, body
+    if isinstance(body, str):
+        return 'form', dict(parse_qsl(body, keep_blank_values=True))
+    return 'form', dict(body)
+
+class Recorder:
+    """
+    把每次请求和响应(含发送时间和耗时)逐行写入抓包文件，文件名以.gz结尾时压缩保存
+    超时、连接中断等没有响应的请求也会记录，status为None，error为异常类型
+    token和密码在写入前脱敏
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self.count = 0
+        opener = gzip.open if path.endswith('.gz') else open
+        self._file = opener(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, method, url, kind, body, status, elapsed, text, sent_at=None, error=None):
+        """
+        记录一次请求
+        :param kind: 请求体类型(json、form或None)
+        :param body: 解析后的请求体
+        :param elapsed: 收到响应的耗时(秒)，请求失败时为发送到失败经过的时间
+        :param text: 响应内容，请求失败时为错误信息
+        :param sent_at: 发送时间，默认按当前时间减去耗时计算
+        :param error: 请求失败时的异常类型名
+        """
+        if sent_at is None:
+            sent_at = time.time() - (elapsed or 0)
+        try:
+            response = redact(json.loads(text))
+        except (TypeError, ValueError):
+            response = text
+        entry = {
+            't': round(sent_at - self.started, 4),
+            'method': method,
+            'path': urlsplit(url).path,
+            'kind': kind,
+            'body': redact(body),
+            'status': status,
+            'elapsed': None if elapsed is None else round(elapsed, 4),
+            'response': response,
+        }
+        if error:
+            entry['error'] = error
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.count += 1
+
+    def on_response(self, response, *args, **kwargs):
+        """requests的响应钩子"""
+        request = response.request
+        kind, body = parse_body(request.body, request.headers.get('Content-Type'))
+        elapsed = response.elapsed.total_seconds()
+        self.record(request.method, request.url, kind, body, response.status_code, elapsed, response.text)
+        return response
+
+    def on_error(self, request, error, sent_at):
+        """
+        记录没有收到响应的请求(超时、连接中断、DNS解析失败等)
+        :param request: requests的PreparedRequest
+        :param error: 请求抛出的异常
+        :param sent_at: 发送时间
+        """
+        kind, body = parse_body(request.body, request.headers.get('Content-Type'))
+        self.record(request.method, request.url, kind, body, None, time.time() - sent_at, str(error),
+                    sent_at=sent_at, error=type(error).__name__)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                print(f"[抓包] 已记录 {self.count} 次请求到 {self.path}")
+
+def open_recorder(path):
+    """创建记录器，程序退出时自动关闭文件"""
+    recorder = Recorder(path)
+    atexit.register(recorder.close)
+    print(f"[抓包] 请求和响应将记录到 {path}(token和密码已脱敏)")
+    return recorder
+
+def load_capture(path):
+    """读取抓包文件，返回按发送时间排序的记录列表"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
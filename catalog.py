@@ -0,0 +1,139 @@
+from bisect import bisect_left
+
+# 素质拓展选修课没有tcList，每条记录本身就是一个教学班
+FLAT_COURSE_TYPE = "素质拓展选修课"
+
+def is_flat_course(course):
+    """是否是班级信息在顶层对象中的素质拓展选修课"""
+    return course.get("XGXKLB") == FLAT_COURSE_TYPE
+
+def free_seats(class_info):
+    """教学班剩余名额(课容量 - 已选人数)，数据缺失时视为0"""
+    try:
+        return int(class_info.get("KRL", 0)) - int(class_info.get("YXRS", 0))
+    except (TypeError, ValueError):
+        return 0
+
+class Catalog:
+    """
+    课程目录索引，每次获取课程列表后构建一次
+    课程按KCH、KCM、KKDW索引，教学班按JXBID、SKJS索引，
+    另按剩余名额和课程名排序，支持二分查找
+    """
+
+    def __init__(self):
+        self.courses = []      # 按获取顺序排列的课程
+        self.by_kch = {}       # {课程号: [课程]}
+        self.by_kcm = {}       # {课程名: [课程]}
+        self.by_kkdw = {}      # {开课单位: [课程]}
+        self.classes = {}      # {教学班ID: (课程, 教学班)}
+        self._position = {}    # {教学班ID: 加入顺序}
+        self.by_teacher = {}   # {授课教师: [教学班ID]}
+        self._by_free = None   # [(剩余名额, 教学班ID)]，按剩余名额排序
+        self._by_name = None   # [(课程名, 序号)]，按课程名排序
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由课程行列表(或clazz/list的完整响应)构建目录"""
+        if isinstance(rows, dict):
+            rows = rows.get('data', {}).get('rows', [])
+        catalog = cls()
+        for row in rows:
+            catalog.add(row)
+        return catalog
+
+    def __len__(self):
+        return len(self.courses)
+
+    def __iter__(self):
+        return iter(self.courses)
+
+    def __getitem__(self, index):
+        return self.courses[index]
+
+    def add(self, course):
+        """加入一门课程并更新索引"""
+        if "tcList" not in course and not is_flat_course(course):
+            return
+        self.courses.append(course)
+        self.by_kch.setdefault(course.get("KCH"), []).append(course)
+        self.by_kcm.setdefault(course.get("KCM"), []).append(course)
+        self.by_kkdw.setdefault(course.get("KKDW"), []).append(course)
+        for class_info in self.classes_of(course):
+            jxbid = class_info.get("JXBID")
+            if not jxbid:
+                continue
+            self.classes[jxbid] = (course, class_info)
+            self._position.setdefault(jxbid, len(self._position))
+            self.by_teacher.setdefault(class_info.get("SKJS"), []).append(jxbid)
+        # 有序索引在下次查询时重建
+        self._by_free = None
+        self._by_name = None
+
+    @staticmethod
+    def classes_of(course):
+        """课程下的教学班列表，素质拓展选修课的教学班就是课程本身"""
+        if is_flat_course(course):
+            return [course]
+        return course.get("tcList") or []
+
+    def get_class(self, jxbid):
+        """按教学班ID查找，返回(课程, 教学班)，不存在时返回None"""
+        return self.classes.get(jxbid)
+
+    def get_courses(self, kch=None, kcm=None, kkdw=None):
+        """按课程号、课程名或开课单位查找课程"""
+        if kch is not None:
+            return self.by_kch.get(kch, [])
+        if kcm is not None:
+            return self.by_kcm.get(kcm, [])
+        if kkdw is not None:
+            return self.by_kkdw.get(kkdw, [])
+        return self.courses
+
+    def search_name(self, prefix):
+        """按课程名前缀查找课程"""
+        if self._by_name is None:
+            self._by_name = sorted(
+                (course.get("KCM") or "", i) for i, course in enumerate(self.courses)
+            )
+        start = bisect_left(self._by_name, (prefix,))
+        result = []
+        for name, i in self._by_name[start:]:
+            if not name.startswith(prefix):
+                break
+            result.append(self.courses[i])
+        return result
+
+    def free_class_ids(self, min_free=1):
+        """剩余名额不少于min_free的教学班ID"""
+        if self._by_free is None:
+            self._by_free = sorted(
+                (free_seats(class_info), jxbid)
+                for jxbid, (_, class_info) in self.classes.items()
+            )
+        start = bisect_left(self._by_free, (min_free,))
+        return [jxbid for _, jxbid in self._by_free[start:]]
+
+    def query(self, teacher=None, kch=None, kkdw=None, min_free=0):
+        """
+        组合条件查询教学班
+        :return: [(课程, 教学班)]，顺序与课程列表一致
+        """
+        candidates = None
+        if teacher is not None:
+            candidates = set(self.by_teacher.get(teacher, []))
+        if kch is not None or kkdw is not None:
+            ids = {
+                class_info.get("JXBID")
+                for course in self.get_courses(kch=kch, kkdw=kkdw)
+                for class_info in self.classes_of(course)
+            }
+            candidates = ids if candidates is None else candidates & ids
+        if min_free > 0:
+            ids = set(self.free_class_ids(min_free))
+            candidates = ids if candidates is None else candidates & ids
+
+        if candidates is None:
+            return list(self.classes.values())
+        return [self.classes[jxbid] for jxbid in sorted(candidates, key=self._position.get)]
@@ -0,0 +1,134 @@
+import os
+import time
+import codec
+
+def row_key(row):
+    """课程行的唯一标识：素质拓展选修课以教学班ID区分，其余以课程号区分"""
+    return row.get('JXBID') or row.get('KCH')
+
+def _merge_list(old, new):
+    """按教学班ID合并班级列表，返回是否有变化"""
+    if not all(isinstance(item, dict) and item.get('JXBID') for item in old + new):
+        if old != new:
+            old[:] = new
+            return True
+        return False
+
+    changed = len(old) != len(new)
+    existing = {item['JXBID']: item for item in old}
+    merged = []
+    for item in new:
+        current = existing.get(item['JXBID'])
+        if current is None:
+            merged.append(item)
+            changed = True
+        else:
+            changed = _merge_dict(current, item) or changed
+            merged.append(current)
+    old[:] = merged
+    return changed
+
+def _merge_dict(old, new):
+    """把new中变化的字段写入old，返回是否有变化"""
+    changed = False
+    for key in list(old):
+        if key not in new:
+            del old[key]
+            changed = True
+    for key, value in new.items():
+        current = old.get(key)
+        if current == value:
+            continue
+        if isinstance(current, dict) and isinstance(value, dict):
+            changed = _merge_dict(current, value) or changed
+        elif isinstance(current, list) and isinstance(value, list):
+            changed = _merge_list(current, value) or changed
+        else:
+            old[key] = value
+            changed = True
+    return changed
+
+class CatalogCache:
+    """
+    课程列表缓存，按(批次ID, 校区, 课程类型)区分
+    内存中保存一份，同时写入cache_dir目录，文件修改时间即获取时间
+    """
+
+    def __init__(self, cache_dir='catalog_cache', ttl=300):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._entries = {}  # {key: (获取时间, 课程行列表)}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, '_'.join(key) + '.json')
+
+    def _load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                rows = codec.load(f)
+        except Exception as e:
+            print(f"读取课程缓存失败: {str(e)}")
+            return None
+        entry = (os.path.getmtime(path), rows)
+        self._entries[key] = entry
+        return entry
+
+    def age(self, key):
+        """缓存已存在的秒数，没有缓存时返回None"""
+        entry = self._entries.get(key) or self._load(key)
+        if entry is None:
+            return None
+        return time.time() - entry[0]
+
+    def get(self, key):
+        """获取未过期的课程行列表，没有或已过期时返回None"""
+        entry = self._entries.get(key) or self._load(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def update(self, key, rows):
+        """
+        用新获取的课程行刷新缓存
+        只把变化的行(如已选人数、课容量)合并进已缓存的副本，没有变化时不重写文件
+        :param rows: 课程行，可以是逐行读取文件的StreamedCourses，只遍历一次
+        :return: 合并后的课程行列表
+        """
+        entry = self._entries.get(key) or self._load(key)
+        path = self._path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        if entry is None:
+            cached = list(rows)
+            changed, added, removed = 0, len(cached), 0
+        else:
+            cached = entry[1]
+            existing = {row_key(row): row for row in cached}
+            merged = []
+            changed = added = 0
+            for row in rows:
+                current = existing.pop(row_key(row), None)
+                if current is None:
+                    merged.append(row)
+                    added += 1
+                else:
+                    if _merge_dict(current, row):
+                        changed += 1
+                    merged.append(current)
+            removed = len(existing)
+            cached[:] = merged
+
+        if entry is None or changed or added or removed:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(codec.dumps(cached))
+        else:
+            # 内容没有变化，只刷新获取时间
+            os.utime(path)
+
+        self._entries[key] = (time.time(), cached)
+        if entry is not None:
+            print(f"课程缓存已刷新: 变化 {changed} 条, 新增 {added} 条, 移除 {removed} 条")
+        return cached
@@ -0,0 +1,149 @@
+import sqlite3
+import time
+from catalog import is_flat_course
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    campus TEXT NOT NULL,
+    class_type TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS courses (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+    KCH TEXT,
+    KCM TEXT,
+    KKDW TEXT,
+    XGXKLB TEXT
+);
+CREATE TABLE IF NOT EXISTS classes (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+    JXBID TEXT NOT NULL,
+    KCH TEXT,
+    KCM TEXT,
+    secretVal TEXT,
+    KRL INTEGER,
+    YXRS INTEGER,
+    SKJS TEXT,
+    KXH TEXT,
+    teachingPlace TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_key ON snapshots(batch_id, campus, class_type, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_courses_kch ON courses(snapshot_id, KCH);
+CREATE INDEX IF NOT EXISTS idx_classes_jxbid ON classes(JXBID, snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_classes_kch ON classes(snapshot_id, KCH);
+CREATE INDEX IF NOT EXISTS idx_classes_teacher ON classes(snapshot_id, SKJS);
+CREATE INDEX IF NOT EXISTS idx_classes_free ON classes(snapshot_id, (KRL - YXRS));
+"""
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class CatalogDB:
+    """
+    SQLite课程库，每次获取课程列表保存为一个带时间戳的快照
+    保留所有课程类型和历史快照，查询默认使用各类型最新的完整快照
+    快照在所有页面写入后才标记为完整，获取中途失败或仍在写入的快照不会被查询到
+    """
+
+    def __init__(self, path="catalog.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(snapshots)")]
+        if "complete" not in columns:
+            # 旧版课程库没有complete列，已有快照视为完整
+            with self.conn:
+                self.conn.execute("ALTER TABLE snapshots ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def begin_snapshot(self, batch_id, campus, class_type):
+        """新建快照(未完成)，返回快照ID，写完所有页面后调用finish_snapshot"""
+        cur = self.conn.execute(
+            "INSERT INTO snapshots (batch_id, campus, class_type, fetched_at, complete) VALUES (?, ?, ?, ?, 0)",
+            (batch_id, campus, class_type, time.time()),
+        )
+        self.conn.commit()
+        return cur.lastrowid
+
+    def add_rows(self, snapshot_id, rows):
+        """把一页课程行写入快照"""
+        courses = []
+        classes = []
+        for course in rows:
+            courses.append((
+                snapshot_id, course.get("KCH"), course.get("KCM"),
+                course.get("KKDW"), course.get("XGXKLB"),
+            ))
+            class_list = [course] if is_flat_course(course) else course.get("tcList") or []
+            for class_info in class_list:
+                if not class_info.get("JXBID"):
+                    continue
+                classes.append((
+                    snapshot_id, class_info["JXBID"], course.get("KCH"), course.get("KCM"),
+                    class_info.get("secretVal"), _to_int(class_info.get("KRL")),
+                    _to_int(class_info.get("YXRS")), class_info.get("SKJS"),
+                    class_info.get("KXH"), class_info.get("teachingPlace"),
+                ))
+        with self.conn:
+            self.conn.executemany("INSERT INTO courses VALUES (?, ?, ?, ?, ?)", courses)
+            self.conn.executemany("INSERT INTO classes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", classes)
+
+    def finish_snapshot(self, snapshot_id):
+        """所有页面写入后把快照标记为完整"""
+        with self.conn:
+            self.conn.execute("UPDATE snapshots SET complete = 1 WHERE id = ?", (snapshot_id,))
+
+    def drop_snapshot(self, snapshot_id):
+        """删除未完成的快照"""
+        with self.conn:
+            self.conn.execute("DELETE FROM snapshots WHERE id = ?", (snapshot_id,))
+
+    def latest_snapshot(self, batch_id, campus, class_type):
+        """某批次、校区、课程类型最新的完整快照ID"""
+        row = self.conn.execute(
+            "SELECT id FROM snapshots WHERE batch_id = ? AND campus = ? AND class_type = ? AND complete = 1 "
+            "ORDER BY fetched_at DESC LIMIT 1",
+            (batch_id, campus, class_type),
+        ).fetchone()
+        return row["id"] if row else None
+
+    def find_classes(self, snapshot_id, teacher=None, kch=None, min_free=0):
+        """在快照中按教师、课程号、剩余名额查询教学班，顺序与课程列表一致"""
+        sql = "SELECT * FROM classes WHERE snapshot_id = ?"
+        params = [snapshot_id]
+        if teacher:
+            sql += " AND SKJS = ?"
+            params.append(teacher)
+        if kch:
+            sql += " AND KCH = ?"
+            params.append(kch)
+        if min_free > 0:
+            sql += " AND (KRL - YXRS) >= ?"
+            params.append(min_free)
+        sql += " ORDER BY rowid"
+        return self.conn.execute(sql, params).fetchall()
+
+    def latest_class(self, jxbid):
+        """教学班在最近一次完整快照中的信息，没有记录时返回None"""
+        return self.conn.execute(
+            "SELECT c.*, s.class_type, s.fetched_at FROM classes c "
+            "JOIN snapshots s ON s.id = c.snapshot_id "
+            "WHERE c.JXBID = ? AND s.complete = 1 ORDER BY s.fetched_at DESC LIMIT 1",
+            (jxbid,),
+        ).fetchone()
@@ -0,0 +1,88 @@
+import os
+import codec
+
+# 课程列表文件：每行一条紧凑JSON格式的课程记录
+CATALOG_FILE = "save.jsonl"
+
+class CatalogWriter:
+    """
+    按页追加写入课程列表，每页到达后立即落盘
+    先写入临时文件，全部写完后才替换原文件，获取失败时保留上次的课程列表
+    """
+
+    def __init__(self, filename=CATALOG_FILE):
+        self.filename = filename
+        self.count = 0
+        self._tmp = filename + '.tmp'
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._tmp, 'w', encoding='utf-8')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp, self.filename)
+        else:
+            os.remove(self._tmp)
+
+    def write_page(self, rows):
+        """写入一页课程记录"""
+        self._file.writelines(
+            codec.dumps(row) + '\n'
+            for row in rows
+        )
+        self._file.flush()
+        self.count += len(rows)
+
+def iter_rows(filename=CATALOG_FILE):
+    """逐行读取课程记录，内存占用与文件大小无关"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield codec.loads(line)
+
+class StreamedCourses:
+    """
+    以序列方式访问课程列表文件，不把整个文件载入内存
+    第一次完整遍历时记下每条课程所在行的偏移量，之后按序号取课程只读取这一行
+    """
+
+    def __init__(self, filename=CATALOG_FILE, match=None):
+        self.filename = filename
+        self.match = match or (lambda row: True)
+        self._offsets = None  # [行偏移量]，完整遍历一次后才有
+
+    def __iter__(self):
+        offsets = []
+        offset = 0
+        with open(self.filename, 'rb') as f:
+            for line in f:
+                start, offset = offset, offset + len(line)
+                if not line.strip():
+                    continue
+                row = codec.loads(line)
+                if self.match(row):
+                    offsets.append(start)
+                    yield row
+        self._offsets = offsets
+
+    def _index(self):
+        if self._offsets is None:
+            for _ in self:
+                pass
+        return self._offsets
+
+    def __len__(self):
+        return len(self._index())
+
+    def __getitem__(self, index):
+        offsets = self._index()
+        if index < 0:
+            index += len(offsets)
+        if not 0 <= index < len(offsets):
+            raise IndexError(index)
+        with open(self.filename, 'rb') as f:
+            f.seek(offsets[index])
+            return codec.loads(f.readline())
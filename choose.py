@@ -1,8 +1,27 @@
-import requests
 import json
 import time
 import os
+from urllib.parse import urlencode
+import threading
+import logging
+from collections import namedtuple
 from concurrent.futures import ThreadPoolExecutor
+import client
+import codec
+import clock
+import rate
+import outcomes
+import metrics
+import log
+from log import logger
+from prewarm import Prewarmer
+from watch import SeatWatcher
+import session_guard
+from session_guard import SessionGuard, is_expired
+from targets import TargetSet
+
+# 一次选课请求的结果：是否成功(含已选上)、HTTP状态码、响应code、响应msg、耗时(请求失败时为None)、结果类型
+AttemptResult = namedtuple('AttemptResult', ['success', 'status', 'code', 'msg', 'latency', 'outcome'])
 
 def load_course_data(course_files):
     """从文件加载选课信息"""
@@ -12,100 +31,335 @@ def load_course_data(course_files):
         if os.path.exists(file_path)
     ]
 
-def send_course_request(course_data, cookies, headers):
-    """发送选课请求并处理响应"""
-    clazzId = course_data.get('clazzId', '')
-    secretVal = course_data.get('secretVal', '')
+def build_course_form(course_data):
+    """构建选课请求的表单数据"""
+    return {
+        'clazzType': course_data.get('clazzType', 'FANKC'),  # 从课程信息中获取课程类型
+        'clazzId': course_data.get('clazzId', ''),
+        'secretVal': course_data.get('secretVal', ''),
+    }
+
+def prepare_course_request(course_data, headers):
+    """
+    把课程预先构建为可反复发送的选课请求，表单只编码一次
+    :return: client.PreparedPost，重新登录后需要重新构建
+    """
+    body = urlencode(build_course_form(course_data)).encode('utf-8')
+    return client.prepare('/xsxk/elective/clazz/add', headers=headers, data=body)
+
+def handle_course_response(course_data, res, outcome):
+    """处理选课响应，选课成功或已经选上时删除课程文件并返回True"""
     course_name = course_data.get('courseName', '未知课程')
     file_path = course_data.get('file_path', '')
-    clazzType = course_data.get('clazzType', 'FANKC')  # 从课程信息中获取课程类型
-    
-    data = {
-        'clazzType': clazzType,  # 使用课程类型
-        'clazzId': clazzId,
-        'secretVal': secretVal,
-    }
 
-    try:
-        response = requests.post(
-            'http://jwxk.ctgu.edu.cn/xsxk/elective/clazz/add',
-            cookies=cookies,
-            headers=headers,
-            data=data,
-            verify=False,
+    if outcome in (outcomes.SUCCESS, outcomes.HELD):
+        logger.info("%s - %s", course_name, res.get('msg', '未知错误'))
+        # 选课成功后删除文件
+        if file_path and os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+                logger.info("已删除课程文件: %s", file_path)
+            except Exception as e:
+                logger.warning("删除文件失败: %s", e)
+        return True
+    elif 'code' in res:
+        # 每次请求都会产生，只在DEBUG级别输出到控制台
+        logger.log(
+            logging.INFO if outcome == outcomes.TERMINAL else logging.DEBUG,
+            "%s - [%s] %s", course_name, outcomes.OUTCOME_NAMES[outcome], res.get('msg', '未知错误'),
         )
-        response_text = response.text
-        res = response.json()
-        flag = res['code']
-        print(response_text)
-
-        if flag == 500:
-            print(f"{course_name} - {res.get('msg', '未知错误')}")
-        elif flag == 401:
-            print(f"{course_name} - {res.get('msg', '未知错误')}")
-        elif flag == 200:
-            print(f"{course_name} - {res.get('msg', '未知错误')}")
-            # 选课成功后删除文件
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    print(f"已删除课程文件: {file_path}")
-                except Exception as e:
-                    print(f"删除文件失败: {str(e)}")
-            return True
-        else:
-            print(f"{course_name} - 未知响应: {res}")
-    except Exception as e:
-        print(f"{course_name} - 请求失败: {str(e)}")
-    
+    else:
+        logger.warning("%s - 未知响应: %s", course_name, res)
     return False
 
-def task(course_data, cookies, headers, config):
-    """执行单个课程的选课任务"""
+def send_course_request(course_data, headers, table=None, prepared=None):
+    """
+    发送选课请求并处理响应
+    :param table: 响应分类表，默认使用outcomes.default_table
+    :param prepared: prepare_course_request构建的请求，提供时直接发送，不再每次构建
+    :return: AttemptResult
+    """
     course_name = course_data.get('courseName', '未知课程')
-    print(f"开始选课: {course_name}")
-    
+    table = table or outcomes.default_table
+    response = None
+    meter = metrics.active
+    if meter:
+        meter.begin(course_name)
+
+    try:
+        start = time.time()
+        # 通过全局会话发送，复用已建立的长连接
+        if prepared is not None:
+            response = prepared.send()
+        else:
+            response = client.post(
+                '/xsxk/elective/clazz/add',
+                headers=headers,
+                data=build_course_form(course_data),
+            )
+        latency = time.time() - start
+        # 只解析code和msg
+        res = codec.parse_result(response.content)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", response.text)
+        outcome = table.classify(response.status_code, res.get('code'), res.get('msg', ''))
+        success = handle_course_response(course_data, res, outcome)
+        result = AttemptResult(success, response.status_code, res.get('code'), res.get('msg', ''), latency, outcome)
+    except Exception as e:
+        logger.debug("%s - 请求失败: %s", course_name, e)
+        status = response.status_code if response is not None else None
+        result = AttemptResult(False, status, None, '', None, table.classify(status, None, ''))
+
+    if meter:
+        meter.end(course_name, result)
+    return result
+
+def get_phase_interval(config, current_time):
+    """
+    根据当前所处阶段计算请求间隔
+    :return: (阶段, 秒数)。阶段为'wait'时秒数是距提前开始的等待时间，否则是请求间隔
+    """
     # 获取预定时间和提前时间
     scheduled_time = config.get('scheduled_time')
     advance_time = config.get('advance_time', 30)
+
+    # 没有预定时间，使用配置的间隔
+    if not scheduled_time:
+        return None, config['grab_interval']
+
+    # 还没到提前开始时间，等待
+    if current_time < scheduled_time - advance_time:
+        return 'wait', (scheduled_time - advance_time) - current_time
+
+    # 提前开始阶段（预定时间前advance_time秒到预定时间），使用1秒间隔，且不越过预定时间
+    if current_time < scheduled_time:
+        return 'advance', min(1, scheduled_time - current_time)
+
+    # 正式开始阶段，使用配置的间隔
+    return 'main', config['grab_interval']
+
+def task(course_data, headers, config, watcher=None, controller=None, stop=None, offset=0, guard=None, targets=None, table=None):
+    """
+    执行单个课程的选课任务
+    :param watcher: 余量监视器，提供时正式阶段只在出现空位后连续发送请求
+    :param controller: 自适应间隔控制器，提供时由它决定请求间隔
+    :param stop: 同一课程所有发送线程共用的停止标志，任一线程成功后置位
+    :param offset: 相位偏移(秒)，同一课程的多个发送线程错开发送
+    :param guard: 会话守护，会话过期时由它统一重新登录
+    :param targets: 互斥目标集合，抢到后由它放弃多余或冲突的目标；顺位链中的备选班级以fallback_interval低频发送
+    :param table: 响应分类表，决定继续重试、放慢还是放弃
+    :return: 本线程选课成功返回True，被其他线程取消、无法选上或会话无法恢复时返回False
+    """
+    course_name = course_data.get('courseName', '未知课程')
+    clazz_id = course_data.get('clazzId')
+    stop = stop or threading.Event()
+    table = table or outcomes.default_table
+    retry_later_delay = config.get('retry_later_delay', 3)
+    fallback_interval = config.get('fallback_interval', 3)
+    # 预先构建的选课请求及构建时的会话版本，重新登录后重新构建
+    prepared = None
+    prepared_version = None
+
+    def won():
+        # 通知同一课程的其他发送线程停止，并放弃互斥的目标
+        stop.set()
+        if targets:
+            targets.won(clazz_id)
+        return True
+
+    def give_up(reason):
+        # 无法选上的目标立即退出，不再占用请求
+        stop.set()
+        if targets:
+            targets.give_up(clazz_id, reason)
+        return False
+
+    def pause(interval):
+        """等待下一次请求，备选班级至少等待fallback_interval，期间被提升为主抢时提前结束"""
+        if not (targets and targets.is_fallback(clazz_id)):
+            stop.wait(interval)
+            return
+        deadline = time.time() + max(interval, fallback_interval)
+        while targets.is_fallback(clazz_id) and time.time() < deadline:
+            if stop.wait(min(interval, deadline - time.time())):
+                return
+
+    def attempt():
+        """发送一次请求，会话过期时等待恢复后返回结果，无法恢复时返回None"""
+        nonlocal prepared, prepared_version
+        if guard:
+            guard.wait_ready()
+        # 所有课程共用的全局速率上限
+        if rate.budget:
+            rate.budget.acquire()
+        version = guard.version if guard else 0
+        if prepared_version != version:
+            prepared = prepare_course_request(course_data, headers)
+            prepared_version = version
+        result = send_course_request(course_data, headers, table, prepared)
+        table.record(course_name, result)
+        if guard and is_expired(result) and not guard.report_expired(version):
+            return None
+        return result
+
+    logger.info("开始选课: %s%s", course_name, f" (偏移 {offset:.2f}秒)" if offset else "")
+    staggered = False
     
-    while True:
-        current_time = time.time()
-        
-        # 如果设置了预定时间
-        if scheduled_time:
-            # 提前开始阶段（预定时间前30秒）
-            if current_time < scheduled_time - advance_time:
-                # 还没到提前开始时间，等待
-                wait_time = (scheduled_time - advance_time) - current_time
-                print(f"等待提前开始: {wait_time:.1f}秒")
-                time.sleep(wait_time)
-                continue
-                
-            # 提前开始阶段（预定时间前30秒到预定时间）
-            elif current_time < scheduled_time:
-                # 使用1秒间隔
-                interval = 1
-                print(f"[提前开始] 间隔: {interval}秒")
-                
-            # 正式开始阶段
-            else:
-                # 使用配置的间隔
-                interval = config['grab_interval']
-                print(f"[正式开始] 间隔: {interval}秒")
-        else:
-            # 没有预定时间，使用配置的间隔
-            interval = config['grab_interval']
+    while not stop.is_set():
+        phase, interval = get_phase_interval(config, clock.now())
+
+        if phase == 'wait':
+            logger.info("等待提前开始: %.1f秒", interval)
+            clock.wait_until(clock.now() + interval)
+            continue
+
+        # 开始发送前先错开相位
+        if not staggered:
+            staggered = True
+            if offset and stop.wait(offset):
+                break
+
+        if watcher and phase != 'advance':
+            if watcher.wait_for_seat(clazz_id, timeout=interval):
+                # 出现空位，顺位更高的班级恢复为主抢
+                if targets:
+                    targets.report_open(clazz_id)
+                # 连续发送的请求之间按本课程当前的间隔错开，与普通发送一样受全局速率上限约束
+                spacing = controller.interval if controller else interval
+                for i in range(watcher.burst):
+                    if i:
+                        pause(spacing)
+                    if stop.is_set():
+                        break
+                    watcher.record_attempt()
+                    result = attempt()
+                    if result is None:
+                        stop.set()
+                        return False
+                    if result.success:
+                        return won()
+                    if result.outcome == outcomes.TERMINAL:
+                        return give_up(result.msg)
+                    if controller:
+                        spacing = controller.update(result.latency, result.status, result.code, result.msg)
+                    # 空位已被抢走或服务器要求放慢时结束本轮
+                    if result.outcome == outcomes.FULL:
+                        if targets:
+                            targets.report_full(clazz_id)
+                        break
+                    if result.outcome == outcomes.RETRY_LATER:
+                        pause(retry_later_delay)
+                        break
+            continue
+
+        if controller:
+            interval = controller.interval
+
+        if phase == 'advance':
+            logger.debug("[提前开始] %s 间隔: %.2f秒", course_name, interval)
+        elif phase == 'main':
+            logger.debug("[正式开始] %s 间隔: %.2f秒", course_name, interval)
         
         # 发送请求
-        if send_course_request(course_data, cookies, headers):
-            return True
+        result = attempt()
+        if result is None:
+            stop.set()
+            return False
+        if is_expired(result):
+            # 会话已恢复，立即重试
+            continue
+        if result.success:
+            return won()
+        if result.outcome == outcomes.TERMINAL:
+            return give_up(result.msg)
+        # 已满时由顺位链中未满的班级接替，不再已满时恢复原来的顺位
+        if targets:
+            if result.outcome == outcomes.FULL:
+                targets.report_full(clazz_id)
+            else:
+                targets.report_open(clazz_id)
+
+        # 根据本次响应调整间隔
+        if controller:
+            interval = controller.update(result.latency, result.status, result.code, result.msg)
+        # 服务器繁忙或限流时放慢
+        if result.outcome == outcomes.RETRY_LATER:
+            interval = max(interval, retry_later_delay)
         
-        # 根据当前阶段等待
-        time.sleep(interval)
+        # 根据当前阶段等待，提前阶段精确对齐到预定时间(加上本线程的相位偏移)
+        if phase == 'advance':
+            clock.wait_until(min(clock.now() + interval, config['scheduled_time'] + offset))
+        else:
+            pause(interval)
+
+    return False
+
+def task_with_session(session, *args):
+    """多账号模式：在本线程中使用该账号的会话执行task"""
+    client.use_session(session)
+    try:
+        return task(*args)
+    finally:
+        client.use_session(None)
+
+def wait_for_advance_start(scheduled_time, config):
+    """有定时时间时，等待到提前开始时间"""
+    if not scheduled_time:
+        return
+    current_time = clock.now()
+    advance_start_time = scheduled_time - config.get('advance_time', 30)
 
+    # 如果还没到提前开始时间
+    if current_time < advance_start_time:
+        wait_seconds = advance_start_time - current_time
+        print(f"等待 {wait_seconds:.1f} 秒直到提前开始时间...")
+        clock.wait_until(advance_start_time)
 
-def run_selected_courses(course_files, scheduled_time=None, config=None):
+def build_headers(batch_id):
+    """构建选课请求头"""
+    return {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Origin': client.BASE_URL,
+        'Referer': client.url(f'/xsxk/elective/grablessons?batchId={batch_id}'),
+        'batchId': batch_id,
+    }
+
+def submit_course_tasks(executor, course_list, headers, config, watcher, guard, targets, table, session=None):
+    """
+    为每门课程提交senders_per_course个发送任务，相位均匀错开
+    :param session: 多账号模式下该账号的会话
+    :return: (任务列表, 各课程的自适应间隔控制器)
+    """
+    senders = max(1, int(config.get('senders_per_course', 1)))
+    # 每门课程一个自适应间隔控制器，未启用时为None
+    controllers = [rate.create_controller(config) for _ in course_list]
+    # 每门课程一个停止标志，由该课程的所有发送线程共用
+    stops = [threading.Event() for _ in course_list]
+    for course, stop in zip(course_list, stops):
+        targets.register(course.get('clazzId'), stop.set)
+
+    futures = []
+    for course, controller, stop in zip(course_list, controllers, stops):
+        for i in range(senders):
+            args = (
+                course, headers, config, watcher, controller, stop,
+                i * (controller.interval if controller else config['grab_interval']) / senders,
+                guard, targets, table,
+            )
+            if session is None:
+                futures.append(executor.submit(task, *args))
+            else:
+                futures.append(executor.submit(task_with_session, session, *args))
+    return futures, controllers
+
+def save_rate_history(course_list, controllers):
+    """保存各课程的自适应间隔变化"""
+    rate.save_history({
+        f"{course.get('courseName', '未知课程')}({course.get('clazzId', '')})": controller
+        for course, controller in zip(course_list, controllers)
+    })
+
+def run_selected_courses(course_files, scheduled_time=None, config=None, session_info=None):
     # 处理 config 为 None 的情况
     if config is None:
         config = {
@@ -113,59 +367,136 @@ def run_selected_courses(course_files, scheduled_time=None, config=None):
             'max_workers': 5
         }
     
+    """
+    运行选课任务，从文件加载选课信息
+    :param session_info: 调用方持有的会话信息，会话过期重新登录时原地更新，未提供时从session_info.json加载
+    :return: 无法选上或因其他目标抢到而被放弃的课程文件列表
+    """
     # 将预定时间添加到配置中
     config['scheduled_time'] = scheduled_time
 
-    """运行选课任务，从文件加载选课信息"""
     # 如果有定时时间，等待到提前开始时间
-    if scheduled_time:
-        current_time = time.time()
-        advance_start_time = scheduled_time - config.get('advance_time', 30)
-        
-        # 如果还没到提前开始时间
-        if current_time < advance_start_time:
-            wait_seconds = advance_start_time - current_time
-            print(f"等待 {wait_seconds:.1f} 秒直到提前开始时间...")
-            time.sleep(wait_seconds)
+    wait_for_advance_start(scheduled_time, config)
     
     course_list = load_course_data(course_files)
     
     if not course_list:
         print("没有可用的选课信息")
-        return
+        return []
     
     # 从登录信息加载cookies和headers
-    try:
-        with open('session_info.json', 'r', encoding='utf-8') as f:
-            session_info = json.load(f)
-    except Exception as e:
-        print(f"加载登录信息失败: {str(e)}")
-        return
+    if session_info is None:
+        try:
+            with open('session_info.json', 'r', encoding='utf-8') as f:
+                session_info = json.load(f)
+        except Exception as e:
+            print(f"加载登录信息失败: {str(e)}")
+            return []
     
-    cookies = session_info.get('cookies', {})
-    authorization = session_info.get('Authorization', '')
+    # cookies和Authorization由全局会话统一携带
+    client.set_auth(session_info)
     
     # 构建请求头
-    headers = {
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
-        'Authorization': authorization,
-        'Connection': 'keep-alive',
-        'Content-Type': 'application/x-www-form-urlencoded',
-        'Origin': 'http://jwxk.ctgu.edu.cn',
-        'Referer': f'http://jwxk.ctgu.edu.cn/xsxk/elective/grablessons?batchId={session_info.get("batch_id", "")}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
-        'batchId': session_info.get('batch_id', ''),
-    }
+    headers = build_headers(session_info.get('batch_id', ''))
     
     print(f"开始选课，共{len(course_list)}个课程")
-    print(f"使用配置: 抢课间隔={config['grab_interval']}秒, 并发数={config['max_workers']}")
+
+    # 会话过期时统一重新登录
+    guard = SessionGuard(config, session_info)
+    # 同一课程的多个班级、时间冲突的班级互斥，抢到一个后停止其余的
+    targets = TargetSet(course_list)
+    # 响应分类表，无法选上的目标立即放弃
+    table = outcomes.create_table(config)
+
+    # 进程分片模式：课程分到多个进程，各进程有独立的连接池和请求循环
+    if config.get('engine') == 'process':
+        import shard
+        session_guard.active_guard = guard
+        try:
+            shard.run_sharded(course_list, headers, config, guard, targets, table)
+        finally:
+            session_guard.active_guard = None
+            table.report()
+        return targets.retired_files()
+    # 发送线程的日志交给后台线程输出，避免争用控制台
+    log.start(config)
+    # 请求指标：每秒打印一行状态，可选提供Prometheus端口
+    meter = metrics.create(config)
+
+    # 协程模式：所有课程在单线程事件循环中并发请求
+    if config.get('engine') == 'async':
+        import async_choose
+        if async_choose.aiohttp is None:
+            print("未安装aiohttp(pip install aiohttp)，改用线程池模式")
+        elif config.get('seat_watch'):
+            print("协程模式不支持余量监视(seat_watch)，改用线程池模式")
+        else:
+            print(f"使用配置: 抢课间隔={config['grab_interval']}秒, 协程并发上限={config.get('async_concurrency', 200)}, "
+                  f"每门课程发送者数={max(1, int(config.get('senders_per_course', 1)))}")
+            session_guard.active_guard = guard
+            rate.create_budget(config)
+            controllers = [rate.create_controller(config) for _ in course_list]
+            try:
+                async_choose.run_selected_courses_async(
+                    course_list, session_info, headers, config, guard, targets, table, controllers,
+                )
+            finally:
+                session_guard.active_guard = None
+                rate.budget = None
+                log.stop()
+                metrics.close(meter)
+                table.report()
+                if config.get('adaptive_rate'):
+                    save_rate_history(course_list, controllers)
+            return targets.retired_files()
+
+    # 每门课程的发送线程数
+    senders = max(1, int(config.get('senders_per_course', 1)))
+    print(f"使用配置: 抢课间隔={config['grab_interval']}秒, 并发数={config['max_workers']}, 每门课程发送线程数={senders}")
+    if len(course_list) * senders > config['max_workers']:
+        print(f"注意: 共需 {len(course_list) * senders} 个发送线程，超过并发数，多出的线程需等待空闲")
+
+    # 提前阶段预热连接，开抢时各线程直接使用已建立的长连接
+    prewarmer = None
+    if scheduled_time and config.get('prewarm', True) and clock.now() < scheduled_time:
+        prewarmer = Prewarmer(
+            min(config['max_workers'], len(course_list) * senders),
+            interval=config.get('prewarm_interval', 5),
+        )
+        prewarmer.start(until=scheduled_time)
+
+    # 余量监视模式：只在目标班级出现空位时发送选课请求
+    watcher = None
+    if config.get('seat_watch'):
+        watcher = SeatWatcher(course_list, session_info.get('batch_id', ''), config)
+        watcher.start(start_at=scheduled_time)
+
+    session_guard.active_guard = guard
+    # 全局请求速率上限
+    rate.create_budget(config)
+    controllers = []
     
-    # 使用线程池并发选课
-    with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
-        # 为每个课程提交任务
-        futures = [executor.submit(task, course, cookies, headers, config) for course in course_list]
-        
-        # 等待所有任务完成
-        for future in futures:
-            future.result()
+    try:
+        # 使用线程池并发选课
+        with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
+            futures, controllers = submit_course_tasks(
+                executor, course_list, headers, config, watcher, guard, targets, table,
+            )
+            
+            # 等待所有任务完成
+            for future in futures:
+                future.result()
+    finally:
+        session_guard.active_guard = None
+        rate.budget = None
+        log.stop()
+        metrics.close(meter)
+        table.report()
+        if prewarmer:
+            prewarmer.stop()
+        if watcher:
+            watcher.stop()
+        if config.get('adaptive_rate') and controllers:
+            save_rate_history(course_list, controllers)
+
+    return targets.retired_files()
@@ -0,0 +1,224 @@
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import connection as urllib3_connection
+from capture import open_recorder
+import codec
+
+# 选课系统地址
+BASE_URL = 'http://jwxk.ctgu.edu.cn'
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
+
+# 默认超时(连接超时, 读取超时)，单位秒
+DEFAULT_TIMEOUT = (5, 15)
+
+_session = None
+_lock = threading.Lock()
+_auth_lock = threading.Lock()
+
+# 多账号模式下各线程当前使用的账号会话
+_local = threading.local()
+
+# 抓包记录器，配置了capture_file时记录所有请求和响应
+recorder = None
+
+# 已固定解析结果的主机: {主机名: IP}
+_pinned_hosts = {}
+_create_connection = urllib3_connection.create_connection
+
+
+def _pinned_create_connection(address, *args, **kwargs):
+    host, port = address
+    return _create_connection((_pinned_hosts.get(host, host), port), *args, **kwargs)
+
+
+# 新建连接时优先使用固定的IP，跳过DNS解析
+urllib3_connection.create_connection = _pinned_create_connection
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """带默认超时的连接池适配器"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        sent_at = time.time()
+        try:
+            return super().send(request, **kwargs)
+        except requests.RequestException as e:
+            # 没有响应时不会触发响应钩子，在这里记录失败的请求
+            if recorder is not None:
+                recorder.on_error(request, e, sent_at)
+            raise
+
+
+def resolve_timeout(value):
+    """把配置中的超时统一为(连接超时, 读取超时)"""
+    if not value:
+        return DEFAULT_TIMEOUT
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return (value, value)
+
+
+def url(path):
+    """拼接选课系统的完整地址"""
+    return f"{BASE_URL}{path}"
+
+
+def _capture_response(response, *args, **kwargs):
+    if recorder is not None:
+        recorder.on_response(response)
+    return response
+
+
+def _build_session(pool_size, timeout, adapter=None):
+    session = requests.Session()
+    # 所有请求都发往同一个主机，连接池大小决定可复用的长连接数量
+    if adapter is None:
+        adapter = TimeoutHTTPAdapter(
+            timeout=timeout,
+            pool_connections=1,
+            pool_maxsize=pool_size,
+        )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.verify = False
+    session.headers.update({
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
+        'Connection': 'keep-alive',
+        'User-Agent': USER_AGENT,
+    })
+    session.hooks['response'].append(_capture_response)
+    return session
+
+
+def init_client(config=None):
+    """
+    按配置初始化全局HTTP客户端
+    :param config: 配置字典，连接池大小取自max_workers，超时取自request_timeout，选课系统地址取自base_url，
+        配置了capture_file时把所有请求和响应记录到该文件，JSON解析库取自json_backend
+    """
+    global _session, BASE_URL, recorder
+    config = config or {}
+    codec.use(config.get('json_backend', 'auto'))
+    # 可改为本地模拟服务器(mock_server.py)的地址
+    BASE_URL = (config.get('base_url') or BASE_URL).rstrip('/')
+    if config.get('capture_file') and recorder is None:
+        recorder = open_recorder(config['capture_file'])
+    # 除抢课线程外，再为心跳、会话验证线程预留连接
+    pool_size = int(config.get('max_workers', 5)) + 4
+    timeout = resolve_timeout(config.get('request_timeout'))
+
+    with _lock:
+        old = _session
+        _session = _build_session(pool_size, timeout)
+        if old is not None:
+            # 重建连接池时保留已有的登录状态
+            _session.cookies.update(old.cookies)
+            if 'Authorization' in old.headers:
+                _session.headers['Authorization'] = old.headers['Authorization']
+            old.close()
+    return _session
+
+
+def _shared_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session(9, DEFAULT_TIMEOUT)
+    return _session
+
+
+def get_session():
+    """获取当前线程使用的HTTP会话：多账号模式下为该线程的账号会话，否则为全局会话"""
+    return getattr(_local, 'session', None) or _shared_session()
+
+
+def account_session():
+    """
+    新建一个账号会话，拥有独立的cookies和Authorization，
+    与全局会话共用同一个连接池适配器
+    """
+    adapter = _shared_session().get_adapter(BASE_URL)
+    return _build_session(None, None, adapter)
+
+
+def use_session(session):
+    """指定当前线程使用的账号会话，传入None恢复使用全局会话"""
+    _local.session = session
+
+
+def set_auth(session_info):
+    """把登录得到的cookies和Authorization写入当前线程的会话"""
+    session = get_session()
+    with _auth_lock:
+        session.cookies.update(session_info.get('cookies', {}))
+        authorization = session_info.get('Authorization', '')
+        if authorization:
+            session.headers['Authorization'] = authorization
+        else:
+            session.headers.pop('Authorization', None)
+
+
+def post(path, **kwargs):
+    """通过全局会话向选课系统发送POST请求"""
+    return get_session().post(url(path), **kwargs)
+
+
+class PreparedPost:
+    """
+    预先构建好的POST请求，可反复发送
+    请求体编码、会话请求头和cookies的合并、代理等环境设置的查找只在构建时做一次
+    """
+
+    def __init__(self, session, prepared, settings):
+        self.session = session
+        self.prepared = prepared
+        self.settings = settings
+
+    def send(self):
+        return self.session.send(self.prepared, **self.settings)
+
+
+def prepare(path, headers=None, data=None):
+    """
+    用当前线程的会话构建可反复发送的POST请求
+    会话的Authorization或cookies变化后(如重新登录)需要重新构建
+    """
+    session = get_session()
+    prepared = session.prepare_request(requests.Request('POST', url(path), headers=headers, data=data))
+    settings = session.merge_environment_settings(prepared.url, {}, None, None, None)
+    return PreparedPost(session, prepared, settings)
+
+
+def pin_host(host=None):
+    """
+    解析并固定主机地址，之后新建连接不再查询DNS
+    :param host: 主机名，默认为选课系统主机
+    :return: 固定的IP，解析失败时返回None
+    """
+    host = host or urlsplit(BASE_URL).hostname
+    try:
+        infos = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)
+    except OSError as e:
+        print(f"解析 {host} 失败: {e}")
+        return None
+    ip = infos[0][4][0]
+    _pinned_hosts[host] = ip
+    return ip
+
+
+def unpin_host(host=None):
+    """取消固定的主机地址"""
+    _pinned_hosts.pop(host or urlsplit(BASE_URL).hostname, None)
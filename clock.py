@@ -0,0 +1,99 @@
+import time
+import statistics
+from datetime import datetime
+import client
+
+# 服务器时间与本机时间之差(秒)，服务器时间 = 本机时间 + offset
+offset = 0.0
+
+# wait_until最后忙等对齐的秒数
+SPIN = 0.002
+
+def parse_server_time(value):
+    """把/xsxk/web/now返回的currentTime解析为时间戳(秒)"""
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        value = float(value)
+        # 13位为毫秒时间戳
+        return value / 1000 if value > 1e11 else value
+
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的服务器时间: {value}")
+
+def sample_once():
+    """
+    采样一次服务器时间
+    :return: (偏移量, 往返时间)，按NTP的方式假设服务器时间取自请求往返的中点
+    """
+    t0 = time.time()
+    resp = client.post(
+        "/xsxk/web/now",
+        headers={
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Referer": client.url("/xsxk/profile/index.html"),
+        }
+    )
+    t1 = time.time()
+    data = resp.json()
+    server_time = parse_server_time(data['data']['currentTime'])
+    return server_time - (t0 + t1) / 2, t1 - t0
+
+def sync(samples=8, pause=0.2):
+    """
+    多次采样估计本机与服务器的时钟偏移
+    取往返时间最短的样本作为偏移量(该样本受排队延迟影响最小)，样本偏移的标准差作为抖动
+    :return: 包含offset、rtt、jitter、samples的字典，全部失败时返回None
+    """
+    global offset
+    results = []
+    for i in range(samples):
+        try:
+            results.append(sample_once())
+        except Exception as e:
+            print(f"[时钟同步] 第{i + 1}次采样失败: {e}")
+        if i < samples - 1:
+            time.sleep(pause)
+
+    if not results:
+        print("[时钟同步] 无可用样本，继续使用本机时间")
+        return None
+
+    best_offset, best_rtt = min(results, key=lambda r: r[1])
+    offset = best_offset
+    jitter = statistics.pstdev([r[0] for r in results]) if len(results) > 1 else 0.0
+    return {
+        'offset': best_offset,
+        'rtt': best_rtt,
+        'jitter': jitter,
+        'samples': len(results),
+    }
+
+def report(stats):
+    """打印时钟同步结果"""
+    if not stats:
+        return
+    print(f"[时钟同步] 样本数: {stats['samples']} | "
+          f"偏移: {stats['offset'] * 1000:+.1f}ms | "
+          f"最小往返: {stats['rtt'] * 1000:.1f}ms | "
+          f"抖动: {stats['jitter'] * 1000:.1f}ms")
+
+def now():
+    """按服务器时间返回当前时间戳"""
+    return time.time() + offset
+
+def wait_until(target, spin=SPIN):
+    """
+    等待到服务器时间target
+    先用sleep等到目标前spin秒，再忙等对齐，避免sleep唤醒误差导致晚发；
+    忙等只覆盖最后spin秒，多个线程同时等待时不会长时间占用CPU
+    """
+    while True:
+        remaining = target - now()
+        if remaining <= spin:
+            break
+        time.sleep(remaining - spin)
+    while now() < target:
+        pass
@@ -0,0 +1,122 @@
+import importlib.util
+import json
+import re
+
+# 可选的JSON库，安装后解析更快；只导入实际选用的
+orjson = None
+msgspec = None
+_result_decoder = None
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+# 当前使用的JSON库，第一次使用前为None，届时按auto选择
+backend = None
+
+# 选课响应形如 {"code":500,"msg":"...","data":null}，使用标准库时code和msg在最前面则只截取这两个字段
+RESULT_PATTERN = re.compile(rb'\s*\{\s*"code"\s*:\s*(-?\d+)\s*,\s*"msg"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+def available():
+    """已安装的JSON库(只检查是否安装，不导入)"""
+    return [name for name in BACKENDS if name == 'json' or importlib.util.find_spec(name) is not None]
+
+def _import(name):
+    """导入选用的JSON库"""
+    global orjson, msgspec, _result_decoder
+    if name == 'orjson' and orjson is None:
+        import orjson as module
+        orjson = module
+    elif name == 'msgspec' and msgspec is None:
+        from typing import Any
+        import msgspec as module
+
+        class _Result(module.Struct):
+            """选课响应中只解码code和msg，其余字段直接跳过"""
+            code: Any = module.UNSET
+            msg: Any = module.UNSET
+
+        _result_decoder = module.json.Decoder(_Result)
+        msgspec = module
+    return name
+
+def _current(using=None):
+    """本次使用的JSON库，确保已导入"""
+    if using:
+        return _import(using)
+    if backend is None:
+        use()
+    return backend
+
+def use(name='auto'):
+    """
+    选择JSON库
+    :param name: orjson、msgspec、json，auto为按此顺序选择第一个已安装的
+    :return: 实际使用的JSON库
+    """
+    global backend
+    installed = available()
+    if name in (None, '', 'auto'):
+        backend = installed[0]
+    elif name in installed:
+        backend = name
+    else:
+        print(f"未安装{name}，使用{installed[0]}解析JSON")
+        backend = installed[0]
+    return _import(backend)
+
+def loads(data, using=None):
+    """
+    解析JSON，data可以是str或bytes
+    :param using: 指定使用的JSON库，默认为当前选择的
+    :raises ValueError: 不是有效的JSON
+    """
+    using = _current(using)
+    if using == 'orjson':
+        return orjson.loads(data)
+    if using == 'msgspec':
+        return msgspec.json.decode(data)
+    if isinstance(data, bytes):
+        # json.loads直接解析bytes时要先探测编码，比先按UTF-8解码更慢
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+def load(file):
+    """解析文件中的JSON"""
+    return loads(file.read())
+
+def dumps(obj):
+    """序列化为紧凑的JSON字符串，保留中文"""
+    using = _current()
+    if using == 'orjson':
+        return orjson.dumps(obj).decode('utf-8')
+    if using == 'msgspec':
+        return msgspec.json.encode(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+def parse_result(data, using=None):
+    """
+    只取出响应中的code和msg
+    msgspec只解码这两个字段；标准库json在code和msg位于最前面时直接截取；
+    orjson完整解析小响应已经比截取更快，解析后取出这两个字段
+    :param data: 响应内容(bytes)
+    :return: 只含code和msg的字典，响应中没有的字段不出现
+    :raises ValueError: 响应不是JSON对象
+    """
+    using = _current(using)
+    if using == 'msgspec':
+        result = _result_decoder.decode(data)
+        return {key: getattr(result, key) for key in ('code', 'msg') if getattr(result, key) is not msgspec.UNSET}
+
+    if using == 'json':
+        match = RESULT_PATTERN.match(data)
+        if match:
+            msg = match.group(2)
+            if b'\\' in msg:
+                msg = json.loads(b'"' + msg + b'"')
+            else:
+                msg = msg.decode('utf-8')
+            return {'code': int(match.group(1)), 'msg': msg}
+
+    res = loads(data, using)
+    if not isinstance(res, dict):
+        raise ValueError(f"响应不是JSON对象: {data[:100]!r}")
+    return {key: res[key] for key in ('code', 'msg') if key in res}
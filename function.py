@@ -2,20 +2,57 @@ import os
 import time
 import json
 import yaml
+import codec
 import threading
 from datetime import datetime
-from choose import run_selected_courses
-import veri_list
 
-def load_config():
+# 距离提前开始超过该秒数时，先等待再重新对时，减少长时间等待中的时钟漂移
+CLOCK_RESYNC_LEAD = 15
+
+def load_config(config_path="config.yaml"):
     """加载配置文件"""
-    config_path = "config.yaml"
     default_config = {
         "username": "",
         "password": "",
         "grab_interval": 1,
         "max_workers": 5,
-        "campus": "01"
+        "campus": "01",
+        "base_url": "http://jwxk.ctgu.edu.cn",
+        "capture_file": "",
+        "accounts": [],
+        "accounts_dir": "accounts",
+        "batch_id": "",
+        "rate_budget": 0,
+        "request_timeout": [5, 15],
+        "json_backend": "auto",
+        "engine": "thread",
+        "async_concurrency": 200,
+        "clock_sync_samples": 8,
+        "prewarm": True,
+        "prewarm_interval": 5,
+        "list_concurrency": 4,
+        "catalog_ttl": 300,
+        "catalog_db": "",
+        "seat_watch": False,
+        "watch_interval": 1,
+        "watch_burst": 3,
+        "adaptive_rate": False,
+        "min_interval": 0.3,
+        "max_interval": 5,
+        "target_latency": 0.8,
+        "senders_per_course": 1,
+        "shards": 0,
+        "retry_later_delay": 3,
+        "fallback_interval": 3,
+        "outcome_rules": [],
+        "metrics_interval": 1,
+        "metrics_port": 0,
+        "log_level": "INFO",
+        "log_file": "grab.log",
+        "log_max_mb": 5,
+        "captcha_ocr": False,
+        "scheduled_at": "",
+        "course_files": []
     }
     
     try:
@@ -82,6 +119,8 @@ def get_existing_courses():
 
 def start_session_verification():
     """启动会话验证线程"""
+    import veri_list
+
     def session_verification_loop():
         time.sleep(30)
         while True:
@@ -106,19 +145,51 @@ def course_selection_loop(session_info, batch_id, config, selected_courses):
     # 在函数内部导入，避免循环导入问题
     from list import get_course_list
     from lesson import display_course_list
+    from catalog_cache import CatalogCache
+    from catalog import Catalog
+    from catalog_db import CatalogDB
+    
+    cache = CatalogCache(ttl=config.get('catalog_ttl', 300))
+    # 配置了课程库时，按条件搜索班级在最新快照中查询
+    db_path = config.get('catalog_db') or None
+    db = CatalogDB(db_path) if db_path else None
+    catalogs = {}  # {缓存键: 课程目录}，每次获取后重建一次
+    force_refresh = False
     
     while True:
         # 选择课程类型
         class_type = select_class_type()
+        cache_key = (batch_id, config['campus'], class_type)
         
-        # 获取课程列表并保存到save.json
-        print("\n正在获取课程列表...")
-        if not get_course_list(session_info, batch_id=batch_id, campus=config['campus'], class_type=class_type):
-            print("获取课程列表失败")
-            break
+        # 缓存未过期时直接使用，否则重新获取并合并到缓存
+        courses = None if force_refresh else cache.get(cache_key)
+        if courses is not None:
+            print(f"\n使用缓存的课程列表({cache.age(cache_key):.0f}秒前获取)")
+        else:
+            print("\n正在获取课程列表...")
+            courses = get_course_list(
+                session_info,
+                batch_id=batch_id,
+                campus=config['campus'],
+                class_type=class_type,
+                concurrency=config.get('list_concurrency', 4),
+                db_path=db_path,
+            )
+            if courses is None:
+                print("获取课程列表失败")
+                break
+            # 从保存的课程列表文件逐行合并到缓存；缓存中的课程行是内存中唯一的一份，
+            # 课程目录的索引引用同一批对象，不再另外复制
+            courses = cache.update(cache_key, courses)
+            catalogs.pop(cache_key, None)
+        force_refresh = False
+        
+        if cache_key not in catalogs:
+            catalogs[cache_key] = Catalog.from_rows(courses)
         
         # 显示课程列表并让用户选择
-        selection = display_course_list(class_type)
+        snapshot_id = db.latest_snapshot(*cache_key) if db else None
+        selection = display_course_list(class_type, catalogs[cache_key], db, snapshot_id)
         
         if not selection:
             print("未选择课程，返回主菜单")
@@ -129,23 +200,28 @@ def course_selection_loop(session_info, batch_id, config, selected_courses):
         class_info = selection['class_info']
         save_path = selection['save_path']
 
-        # 添加到已选课程列表
-        if save_path not in selected_courses:
-            selected_courses.append(save_path)
-        else:
-            print(f"课程文件 {save_path} 已经在选课列表中")
+        # 添加到已选课程列表，按顺位选择的备选班级一起加入
+        fallbacks = selection.get('fallbacks', [])
+        for path in [save_path] + [path for _, path in fallbacks]:
+            if path not in selected_courses:
+                selected_courses.append(path)
+            else:
+                print(f"课程文件 {path} 已经在选课列表中")
         
         print(f"\n已选择课程: {course.get('KCM', '未知课程名')} ({course.get('KCH', '未知代码')})")
         print(f"班级信息:")
         print(f"  老师: {class_info.get('SKJS', '未知')}")
         print(f"  时间地点: {class_info.get('teachingPlace', '未知')}")
         print(f"  总人数: {class_info.get('KRL', '未知')}, 已选人数: {class_info.get('YXRS', '未知')}")
+        for rank, (fallback, _) in enumerate(fallbacks, 2):
+            print(f"  第{rank}顺位: {fallback.get('SKJS', '未知')} {fallback.get('teachingPlace', '未知')}")
         
         # 询问下一步操作
         action = input("\n输入'a'添加更多课程，'r'刷新课程列表，'s'开始选课，其他键返回主菜单: ").lower()
         if action == 'a':
             continue  # 继续添加课程
         elif action == 'r':
+            force_refresh = True
             continue  # 刷新课程列表
         elif action != 's':
             break  # 返回主菜单
@@ -155,12 +231,14 @@ def course_selection_loop(session_info, batch_id, config, selected_courses):
             print("没有选择任何课程")
             continue
         
-        selected_courses, continue_selection = run_course_selection(selected_courses, config)
+        selected_courses, continue_selection = run_course_selection(selected_courses, config, session_info)
         if continue_selection:
             continue
         else:
             break
     
+    if db:
+        db.close()
     return selected_courses
 
 def select_class_type():
@@ -178,13 +256,17 @@ def select_class_type():
         else:
             print("输入无效，请重新输入")
 
-def parse_scheduled_time(input_str):
-    """解析用户输入的定时时间"""
+def parse_scheduled_time(input_str, allow_past=False):
+    """
+    解析用户输入的定时时间
+    :param allow_past: 是否接受过去的时间，接受时由prepare_schedule按立即开始处理
+    :return: 时间戳，无法解析或不接受的过去时间返回None
+    """
     try:
         # 尝试解析为时间戳
         if input_str.isdigit():
             timestamp = float(input_str)
-            if timestamp > time.time():
+            if allow_past or timestamp > time.time():
                 return timestamp
             else:
                 print("时间戳不能是过去时间")
@@ -210,7 +292,7 @@ def parse_scheduled_time(input_str):
                 
                 # 转换为时间戳
                 timestamp = dt.timestamp()
-                if timestamp > time.time():
+                if allow_past or timestamp > time.time():
                     return timestamp
                 else:
                     print("指定的时间不能是过去时间")
@@ -224,17 +306,25 @@ def parse_scheduled_time(input_str):
         print(f"解析时间失败: {str(e)}")
         return None
 
-def view_and_manage_saved_courses(selected_courses):
-    """查看和管理已保存的课程"""
+def view_and_manage_saved_courses(selected_courses, db_path=None):
+    """
+    查看和管理已保存的课程
+    :param db_path: SQLite课程库路径，提供时显示各班级最近一次获取到的人数
+    """
     if not selected_courses:
         print("没有已保存的课程")
         return selected_courses
     
+    db = None
+    if db_path and os.path.exists(db_path):
+        from catalog_db import CatalogDB
+        db = CatalogDB(db_path)
+    
     print("\n已保存的课程:")
     for i, course_file in enumerate(selected_courses, 1):
         try:
-            with open(course_file, 'r', encoding='utf-8') as f:
-                course_data = json.load(f)
+            with open(course_file, 'rb') as f:
+                course_data = codec.load(f)
                 course_name = course_data.get('courseName', '未知课程')
                 teacher = course_data.get('teacher', '未知老师')
                 clazz_type = course_data.get('clazzType', '未知类型')
@@ -242,9 +332,18 @@ def view_and_manage_saved_courses(selected_courses):
                 # 获取课程类型名称
                 type_name = next((v[1] for k, v in CLASS_TYPE_MAP.items() if v[0] == clazz_type), clazz_type)
                 
-                print(f"{i}. {course_name} - {teacher} ({type_name})")
+                # 从课程库按教学班ID查询最近的人数
+                seats = ""
+                latest = db.latest_class(course_data.get('clazzId')) if db else None
+                if latest:
+                    fetched = datetime.fromtimestamp(latest['fetched_at']).strftime('%H:%M:%S')
+                    seats = f" [已选 {latest['YXRS']}/{latest['KRL']}，{fetched}]"
+                
+                print(f"{i}. {course_name} - {teacher} ({type_name}){seats}")
         except Exception:
             print(f"{i}. 无法读取课程文件: {course_file}")
+    if db:
+        db.close()
     
     print("\n操作:")
     print("d. 删除课程")
@@ -312,49 +411,82 @@ def update_course_list_after_selection(selected_courses):
     
     return selected_courses, False
 
-def run_course_selection(selected_courses, config):
-    """运行选课流程"""
+def ask_schedule(config):
+    """
+    询问是否定时抢课，定时时与服务器对时并等待到提前开始时间
+    :return: (预定时间, 抢课专用配置)，立即开始时预定时间为None
+    """
     # 询问是否定时抢课
     schedule_input = input("\n是否定时抢课?(输入时间或直接回车立即开始): ").strip()
     scheduled_time = None
-    advance_time = config.get('advance_time', 30)  # 获取提前时间
-    
     if schedule_input:
         scheduled_time = parse_scheduled_time(schedule_input)
-        if scheduled_time:
-            current_time = time.time()
-            
-            # 计算提前开始时间
-            advance_start_time = scheduled_time - advance_time
-            
-            # 如果提前开始时间还没到
-            if current_time < advance_start_time:
-                wait_time = advance_start_time - current_time
-                print(f"将在 {datetime.fromtimestamp(advance_start_time).strftime('%Y-%m-%d %H:%M:%S')} 提前开始抢课")
-                print(f"距离提前开始还有: {wait_time:.0f} 秒")
-                time.sleep(wait_time)
-            
-            # 如果已经过了提前开始时间但还没到抢课时间
-            elif current_time < scheduled_time:
-                print(f"已过提前开始时间，将在 {datetime.fromtimestamp(scheduled_time).strftime('%Y-%m-%d %H:%M:%S')} 开始正式抢课")
-                print(f"距离正式开始还有: {scheduled_time - current_time:.0f} 秒")
-            
-            # 如果已经过了抢课时间
-            else:
-                print("已经过了抢课时间，将立即开始抢课")
-        else:
+        if not scheduled_time:
             print("时间格式无效，将立即开始抢课")
+    return scheduled_time, prepare_schedule(config, scheduled_time)
+
+def prepare_schedule(config, scheduled_time):
+    """
+    定时抢课时与服务器对时并等待到提前开始时间
+    :return: 抢课专用配置
+    """
+    advance_time = config.get('advance_time', 30)  # 获取提前时间
     
-    # 创建抢课专用配置
-    grab_config = {
-        'grab_interval': config['grab_interval'],  # 使用配置中的间隔
-        'max_workers': config['max_workers'],
+    if scheduled_time:
+        # 在函数内部导入，无头模式只加载用到的模块
+        import clock
+
+        # 与服务器对时，之后的定时判断都按服务器时间进行
+        sync_samples = config.get('clock_sync_samples', 8)
+        clock.report(clock.sync(sync_samples))
+        current_time = clock.now()
+        
+        # 计算提前开始时间
+        advance_start_time = scheduled_time - advance_time
+        
+        # 如果提前开始时间还没到
+        if current_time < advance_start_time:
+            wait_time = advance_start_time - current_time
+            print(f"将在 {datetime.fromtimestamp(advance_start_time).strftime('%Y-%m-%d %H:%M:%S')} 提前开始抢课")
+            print(f"距离提前开始还有: {wait_time:.0f} 秒")
+            if wait_time > CLOCK_RESYNC_LEAD:
+                time.sleep(wait_time - CLOCK_RESYNC_LEAD)
+                # 开抢前重新对时
+                clock.report(clock.sync(sync_samples))
+            clock.wait_until(advance_start_time)
+        
+        # 如果已经过了提前开始时间但还没到抢课时间
+        elif current_time < scheduled_time:
+            print(f"已过提前开始时间，将在 {datetime.fromtimestamp(scheduled_time).strftime('%Y-%m-%d %H:%M:%S')} 开始正式抢课")
+            print(f"距离正式开始还有: {scheduled_time - current_time:.0f} 秒")
+        
+        # 如果已经过了抢课时间
+        else:
+            print("已经过了抢课时间，将立即开始抢课")
+    
+    # 创建抢课专用配置，在完整配置基础上加入本次的时间设置
+    return {
+        **config,
         'advance_time': advance_time,  # 传递提前时间
-        'scheduled_time': scheduled_time  # 传递预定时间
+        'scheduled_time': scheduled_time,  # 传递预定时间
     }
+
+def run_course_selection(selected_courses, config, session_info=None):
+    """
+    运行选课流程
+    :param session_info: 当前会话信息，抢课中重新登录时原地更新，之后获取课程列表和保活使用新会话
+    """
+    from choose import run_selected_courses
+
+    scheduled_time, grab_config = ask_schedule(config)
     
     print("\n开始自动选课...")
-    run_selected_courses(selected_courses, scheduled_time, grab_config)
+    retired = run_selected_courses(selected_courses, scheduled_time, grab_config, session_info) or []
+    
+    # 无法选上或与已抢到课程互斥的课程不再继续抢，课程文件保留
+    if retired:
+        selected_courses = [c for c in selected_courses if c not in retired]
+        print(f"已放弃 {len(retired)} 个无法选上或与已抢到课程冲突的课程(课程文件保留)")
     
     # 更新课程列表
     return update_course_list_after_selection(selected_courses)
@@ -0,0 +1,214 @@
+"""
+无头模式：不需要任何输入，从启动直接进入抢课，适合崩溃后快速重启或由cron、systemd定时启动
+用法: python headless.py [--at "2025-01-10 12:30:00"] [--batch 批次代码] [--courses 课程文件或目录 ...]
+                         [--engine thread] [--workers 15] [--interval 0.5] [--set 配置项=值 ...]
+未在命令行给出的参数取自config.yaml(batch_id、scheduled_at、course_files等)
+会话优先复用session_info.json，失效时重新登录，验证码需开启captcha_ocr自动识别
+退出码: 0 全部抢到, 1 还有未抢到的课程, 2 参数或登录错误
+"""
+import time
+
+# 启动计时从导入本模块开始，其余模块在用到时才导入
+_started = time.perf_counter()
+_started_at = time.time()
+
+import argparse
+import glob
+import os
+import sys
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="无头模式抢课，不需要任何输入")
+    parser.add_argument("--config", default="config.yaml", help="配置文件")
+    parser.add_argument("--at", help="定时抢课时间，格式同交互模式，如 12:30:00；默认取scheduled_at，都为空时立即开始")
+    parser.add_argument("--batch", help="批次代码，默认取batch_id或已保存会话的批次")
+    parser.add_argument("--courses", nargs="+", help="课程文件、目录或通配符，默认取course_files，都为空时为selected_courses/下全部")
+    parser.add_argument("--engine", choices=("thread", "async", "process"), help="抢课引擎")
+    parser.add_argument("--workers", type=int, help="并发数(max_workers)")
+    parser.add_argument("--interval", type=float, help="抢课间隔(grab_interval)")
+    parser.add_argument("--senders", type=int, help="每门课程的发送线程数(senders_per_course)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖任意配置项，值按YAML解析，可重复，如 --set adaptive_rate=true")
+    parser.add_argument("--no-verify", action="store_true", help="不验证保存的会话直接使用，会话过期时由抢课过程中的会话守护重新登录")
+    parser.add_argument("--ocr", action="store_true", help="自动识别验证码(captcha_ocr)")
+    return parser.parse_args(argv)
+
+class Timer:
+    """记录启动各阶段的耗时，第一个阶段从导入本模块开始"""
+
+    def __init__(self):
+        self.marks = []
+        self._last = _started
+        self._last_at = _started_at
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.marks.append((name, now - self._last))
+        self._last = now
+        self._last_at = time.time()
+
+    def report(self, first_request=None):
+        """
+        打印各阶段耗时
+        :param first_request: 第一次选课请求的发送时间，只有线程池引擎能取得
+        """
+        marks = list(self.marks)
+        if first_request is not None:
+            marks.append(("发出第一次选课请求", first_request - self._last_at))
+        print("[启动耗时] " + " | ".join(f"{name} {cost * 1000:.0f}ms" for name, cost in marks))
+
+def apply_overrides(config, args):
+    """把命令行参数写入配置"""
+    import yaml
+
+    for item in args.set:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"--set 参数格式应为 KEY=VALUE: {item}")
+        config[key.strip()] = yaml.safe_load(value)
+    for key, value in (
+        ('engine', args.engine), ('max_workers', args.workers), ('grab_interval', args.interval),
+        ('senders_per_course', args.senders), ('batch_id', args.batch), ('scheduled_at', args.at),
+        ('course_files', args.courses),
+    ):
+        if value is not None:
+            config[key] = value
+    if args.ocr:
+        config['captcha_ocr'] = True
+    # 登录时不等待输入验证码
+    config['headless'] = True
+    return config
+
+def resolve_courses(patterns):
+    """把课程文件、目录和通配符展开为课程文件列表，默认为selected_courses/下全部"""
+    from function import get_existing_courses
+
+    if not patterns:
+        return get_existing_courses()
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matched = sorted(glob.glob(os.path.join(pattern, '*.json')))
+        else:
+            matched = sorted(glob.glob(pattern))
+        for path in matched:
+            if path not in files:
+                files.append(path)
+    return files
+
+def restore_session(config, verify=True):
+    """
+    复用session_info.json中保存的会话，失效时重新登录
+    :return: 会话信息，无法获得时返回None
+    """
+    import json
+    import client
+
+    if os.path.exists('session_info.json'):
+        with open('session_info.json', 'r', encoding='utf-8') as f:
+            session_info = json.load(f)
+        if not verify:
+            client.set_auth(session_info)
+            print("使用保存的会话(未验证)")
+            return session_info
+        from list import verify_session
+        if verify_session(session_info, session_info.get('batch_id', ''), config.get('campus', '01')):
+            print("已恢复保存的会话")
+            return session_info
+        print("保存的会话已失效，重新登录")
+
+    from login import login
+    session_info = login(config)
+    if session_info:
+        client.set_auth(session_info)
+    return session_info
+
+def choose_batch(config, session_info):
+    """批次依次取命令行、配置、保存的会话，只有一个批次时直接使用"""
+    batch_id = config.get('batch_id') or session_info.get('batch_id')
+    if batch_id:
+        return batch_id
+    batch_list = session_info.get('batch_list', [])
+    if len(batch_list) == 1:
+        return batch_list[0]['code']
+    print("请用 --batch 或 batch_id 指定批次，可用批次:")
+    for batch in batch_list:
+        print(f"  {batch['code']}: {batch['name']} (开始时间: {batch['beginTime']})")
+    return None
+
+def watch_first_request(on_request):
+    """第一次选课请求返回时回调其发送时间，用于统计启动耗时"""
+    import client
+
+    def hook(response, *args, **kwargs):
+        if hook.pending and response.request.url.endswith('/xsxk/elective/clazz/add'):
+            hook.pending = False
+            on_request(time.time() - response.elapsed.total_seconds())
+        return response
+
+    hook.pending = True
+    client.get_session().hooks['response'].append(hook)
+
+def main(argv=None):
+    args = parse_args(argv)
+    timer = Timer()
+
+    from function import load_config, parse_scheduled_time, prepare_schedule, save_session_info
+    config = apply_overrides(load_config(args.config), args)
+    timer.mark("加载配置")
+
+    if config.get('accounts'):
+        print("无头模式只支持单个账号，请清空accounts后重试")
+        return 2
+
+    scheduled_time = None
+    if config.get('scheduled_at'):
+        # 已过的时间按立即开始处理，只有无法解析时才退出
+        scheduled_time = parse_scheduled_time(str(config['scheduled_at']), allow_past=True)
+        if not scheduled_time:
+            return 2
+
+    course_files = resolve_courses(config.get('course_files'))
+    if not course_files:
+        print("没有待抢的课程文件")
+        return 2
+
+    import client
+    client.init_client(config)
+    timer.mark("初始化客户端")
+
+    session_info = restore_session(config, verify=not args.no_verify)
+    if not session_info:
+        print("登录失败")
+        return 2
+    batch_id = choose_batch(config, session_info)
+    if not batch_id:
+        return 2
+    if session_info.get('batch_id') != batch_id:
+        session_info = save_session_info(session_info, batch_id)
+    timer.mark("恢复会话")
+
+    first_request = []
+    watch_first_request(first_request.append)
+    print(f"无头模式: 批次 {batch_id}, 课程 {len(course_files)} 门, 引擎 {config.get('engine', 'thread')}, "
+          f"并发数 {config['max_workers']}, 抢课间隔 {config['grab_interval']}秒")
+
+    if scheduled_time:
+        # 等待期间保持会话
+        from heartbeat import keep_session_alive
+        keep_session_alive(session_info, interval=300)
+    grab_config = prepare_schedule(config, scheduled_time)
+    if scheduled_time:
+        # 等待时间不计入启动耗时
+        timer.mark("对时并等待")
+
+    from choose import run_selected_courses
+    run_selected_courses(course_files, scheduled_time, grab_config, session_info)
+    timer.report(first_request[0] if first_request else None)
+
+    remaining = [path for path in course_files if os.path.exists(path)]
+    print(f"已抢到 {len(course_files) - len(remaining)} 门，未抢到 {len(remaining)} 门")
+    return 1 if remaining else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
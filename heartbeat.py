@@ -1,6 +1,7 @@
 import threading
 import time
-import requests
+import client
+import session_guard
 from datetime import datetime, timedelta
 
 def keep_session_alive(session_info, interval=300):
@@ -9,9 +10,19 @@ def keep_session_alive(session_info, interval=300):
     :param session_info: 会话信息字典(包含cookies和Authorization)
     :param interval: 心跳间隔(秒),默认5分钟
     """
+    # cookies和Authorization由全局会话统一携带
+    client.set_auth(session_info)
+
     # 记录开始时间
     start_time = datetime.now()
     
+    def expired(guard, seen_version):
+        # 抢课进行中时交给会话守护重新登录，之后的心跳自动使用新会话
+        if guard:
+            guard.report_expired(seen_version)
+        else:
+            print("会话已过期，需要重新登录")
+
     def heartbeat_loop():
         nonlocal start_time
         while True:
@@ -27,25 +38,30 @@ def keep_session_alive(session_info, interval=300):
                 hours, remainder = divmod(online_duration.seconds, 3600)
                 minutes, seconds = divmod(remainder, 60)
                 
+                # 记录发送时的会话版本，避免会话已被刷新后重复登录
+                guard = session_guard.active_guard
+                seen_version = guard.version if guard else 0
+                
                 # 发送心跳请求
-                resp = requests.post(
-                    "http://jwxk.ctgu.edu.cn/xsxk/web/now",
-                    cookies=session_info.get('cookies', {}),
+                resp = client.post(
+                    "/xsxk/web/now",
                     headers={
                         "Content-Type": "application/x-www-form-urlencoded",
-                        "Referer": "http://jwxk.ctgu.edu.cn/xsxk/profile/index.html",
-                        "Authorization": session_info.get('Authorization', '')
+                        "Referer": client.url("/xsxk/profile/index.html"),
                     }
                 )
                 
                 # 检查响应状态
                 if resp.status_code == 401:  # 会话过期
-                    print("会话已过期，需要重新登录")
-                    break
+                    expired(guard, seen_version)
+                    time.sleep(interval)
+                    continue
                 
                 # 解析响应数据
                 data = resp.json()
-                if data.get("code") == 200:
+                if data.get("code") == 401:
+                    expired(guard, seen_version)
+                elif data.get("code") == 200:
                     print(f"[{current_time.strftime('%H:%M:%S')}] 保活成功 | "
                           f"在线时长: {hours:02d}:{minutes:02d}:{seconds:02d} | "
                           f"服务器时间: {data['data']['currentTime']} | "
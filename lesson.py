@@ -1,23 +1,30 @@
 import json
 import os
+import codec
+from catalog_file import CATALOG_FILE, StreamedCourses
+from catalog import Catalog
 
 def load_and_parse_json(filename):
     """加载并解析JSON文件"""
     try:
-        with open(filename, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        with open(filename, 'rb') as file:
+            return codec.load(file)
     except Exception as e:
         print(f"解析JSON文件时出错: {e}")
         return None
 
+def is_course(data):
+    """判断是否是课程对象（包含tcList字段或XGXKLB字段）"""
+    return "tcList" in data or ("XGXKLB" in data and data["XGXKLB"] == "素质拓展选修课")
+
 def extract_courses(data):
     """递归提取所有包含课程信息的对象"""
     courses = []
     
     # 处理字典类型
     if isinstance(data, dict):
-        # 检查是否是课程对象（包含tcList字段或XGXKLB字段）
-        if "tcList" in data or ("XGXKLB" in data and data["XGXKLB"] == "素质拓展选修课"):
+        # 检查是否是课程对象
+        if is_course(data):
             courses.append(data)
         # 递归检查所有值
         for value in data.values():
@@ -61,15 +68,20 @@ def display_class_info(class_info):
     for key, value in info.items():
         print(f"    {key}: {value}")
 
-def save_selected_course(course_info, class_info, class_type):
-    """保存选择的课程信息到文件"""
+def save_selected_course(course_info, class_info, class_type, rank=None):
+    """
+    保存选择的课程信息到文件
+    :param rank: 同一课程按顺位选择多个班级时该班级的顺位(1为首选)
+    """
     # 对于素质拓展选修课，班级信息在顶层对象中
     if "XGXKLB" in course_info and course_info["XGXKLB"] == "素质拓展选修课":
         selected_data = {
             "clazzId": course_info.get("JXBID", ""),
             "secretVal": course_info.get("secretVal", ""),
             "courseName": course_info.get("KCM", ""),
+            "courseCode": course_info.get("KCH", ""),
             "teacher": course_info.get("SKJS", ""),
+            "teachingPlace": course_info.get("teachingPlace", ""),
             "clazzType": class_type
         }
     else:
@@ -78,9 +90,13 @@ def save_selected_course(course_info, class_info, class_type):
             "clazzId": class_info.get("JXBID", ""),
             "secretVal": class_info.get("secretVal", ""),
             "courseName": course_info.get("KCM", ""),
+            "courseCode": course_info.get("KCH", ""),
             "teacher": class_info.get("SKJS", ""),
+            "teachingPlace": class_info.get("teachingPlace", ""),
             "clazzType": class_type
         }
+    if rank is not None:
+        selected_data["rank"] = rank
     
     # 创建保存目录
     save_dir = "selected_courses"
@@ -91,23 +107,76 @@ def save_selected_course(course_info, class_info, class_type):
     filename = f"{selected_data['clazzId']}.json"
     filepath = os.path.join(save_dir, filename)
     
-    # 保存文件
+    # 先序列化再写入，出错时不会留下空文件
+    content = json.dumps(selected_data, ensure_ascii=False, indent=2)
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(selected_data, f, ensure_ascii=False, indent=2)
+        f.write(content)
     
     print(f"\n已保存选课信息到: {filepath}")
     return filepath
 
-def display_course_list(class_type):
-    """显示课程列表并让用户选择"""
-    filename = "save.json"
-    json_data = load_and_parse_json(filename)
+def search_classes(catalog, class_type, db=None, snapshot_id=None):
+    """
+    按教师、课程代码、剩余名额筛选教学班并选择
+    :param db: SQLite课程库(CatalogDB)，与snapshot_id一起提供时在该快照中查询
+    :param snapshot_id: 与catalog对应的课程库快照ID
+    """
+    teacher = input("教师姓名(回车跳过): ").strip() or None
+    kch = input("课程代码(回车跳过): ").strip() or None
+    only_free = input("只看有余量的班级?(y/n): ").strip().lower() == 'y'
+    min_free = 1 if only_free else 0
     
-    if json_data is None:
+    if db is not None and snapshot_id is not None:
+        # 用课程库的索引查询，再从目录中取出完整的课程和教学班信息
+        rows = db.find_classes(snapshot_id, teacher=teacher, kch=kch, min_free=min_free)
+        results = [catalog.get_class(row["JXBID"]) for row in rows]
+        results = [result for result in results if result]
+    else:
+        results = catalog.query(teacher=teacher, kch=kch, min_free=min_free)
+    if not results:
+        print("没有符合条件的班级")
         return None
     
-    # 提取所有课程
-    courses = extract_courses(json_data)
+    print(f"\n找到 {len(results)} 个班级:")
+    for i, (course, class_info) in enumerate(results, 1):
+        print(f"  班级 {i}:")
+        display_class_info(class_info)
+    
+    while True:
+        choice = input("\n输入班级序号选择班级 (b返回课程列表): ")
+        if choice.lower() == 'b':
+            return None
+        try:
+            index = int(choice) - 1
+        except ValueError:
+            print("请输入有效数字或b返回")
+            continue
+        if 0 <= index < len(results):
+            course, class_info = results[index]
+            return {
+                'course': course,
+                'class_info': class_info,
+                'save_path': save_selected_course(course, class_info, class_type)
+            }
+        print("班级序号无效，请重新输入")
+
+def display_course_list(class_type, json_data=None, db=None, snapshot_id=None):
+    """
+    显示课程列表并让用户选择
+    :param json_data: 课程目录(Catalog)或课程数据，为None时从save.jsonl逐行读取
+    :param db: SQLite课程库(CatalogDB)，提供时按条件搜索在snapshot_id快照中查询
+    """
+    if json_data is None:
+        if not os.path.exists(CATALOG_FILE):
+            print(f"未找到课程列表文件: {CATALOG_FILE}")
+            return None
+        # 按需逐行读取，不把整个课程列表载入内存
+        courses = StreamedCourses(CATALOG_FILE, match=is_course)
+    elif isinstance(json_data, Catalog):
+        courses = json_data
+    else:
+        # 建立课程目录索引
+        courses = Catalog.from_rows(json_data)
     
     if not courses:
         print("未找到任何课程信息")
@@ -121,12 +190,19 @@ def display_course_list(class_type):
             print(f"{i}. {course.get('KCM', '未知课程名')}")
         
         # 用户选择课程
+        searchable = isinstance(courses, Catalog)
+        prompt = "\n输入课程序号查看班级信息 (s按条件搜索班级, q退出): " if searchable else "\n输入课程序号查看班级信息 (q退出): "
         selected_course = None
         while selected_course is None:
             try:
-                choice = input("\n输入课程序号查看班级信息 (q退出): ")
+                choice = input(prompt)
                 if choice.lower() == 'q':
                     return None
+                if searchable and choice.lower() == 's':
+                    selection = search_classes(courses, class_type, db, snapshot_id)
+                    if selection:
+                        return selection
+                    continue
                     
                 index = int(choice) - 1
                 if 0 <= index < len(courses):
@@ -159,35 +235,49 @@ def display_course_list(class_type):
             print(f"  班级 {i}:")
             display_class_info(class_info)
         
-        # 班级选择循环
-        selected_class = None
-        while selected_class is None:
+        # 班级选择循环，可按顺位输入多个班级，首选已满或无法选上时自动改抢下一个
+        selected_classes = None
+        while selected_classes is None:
             try:
-                class_choice = input("\n输入班级序号选择班级 (b返回课程列表, q退出): ")
+                class_choice = input("\n输入班级序号选择班级，多个序号用逗号分隔表示顺位如 2,1,3 (b返回课程列表, q退出): ")
                 if class_choice.lower() == 'q':
                     return None
                 if class_choice.lower() == 'b':
                     # 返回课程列表，重新选择课程
-                    selected_class = 'back'  # 设置特殊值表示返回
+                    selected_classes = 'back'  # 设置特殊值表示返回
                     break
                     
-                class_index = int(class_choice) - 1
-                if 0 <= class_index < len(selected_course['tcList']):
-                    selected_class = selected_course['tcList'][class_index]
+                class_indexes = [int(part) - 1 for part in class_choice.replace('，', ',').split(',') if part.strip()]
+                if class_indexes and len(set(class_indexes)) == len(class_indexes) and all(
+                        0 <= class_index < len(selected_course['tcList']) for class_index in class_indexes):
+                    selected_classes = [selected_course['tcList'][class_index] for class_index in class_indexes]
                 else:
                     print("班级序号无效，请重新输入")
             except ValueError:
                 print("请输入有效数字、b返回或q退出")
         
         # 如果用户选择了返回，则继续课程选择循环
-        if selected_class == 'back':
+        if selected_classes == 'back':
             continue
         
-        # 返回选择的课程和班级信息
+        # 只选一个班级时不记录顺位
+        if len(selected_classes) == 1:
+            return {
+                'course': selected_course,
+                'class_info': selected_classes[0],
+                'save_path': save_selected_course(selected_course, selected_classes[0], class_type)
+            }
+        
+        # 返回选择的课程和首选班级信息，备选班级的课程文件放在fallbacks中
+        paths = [
+            save_selected_course(selected_course, class_info, class_type, rank)
+            for rank, class_info in enumerate(selected_classes, 1)
+        ]
         return {
             'course': selected_course,
-            'class_info': selected_class,
-            'save_path': save_selected_course(selected_course, selected_class, class_type)
+            'class_info': selected_classes[0],
+            'save_path': paths[0],
+            'fallbacks': list(zip(selected_classes[1:], paths[1:]))
         }
 
 def main():
@@ -1,37 +1,72 @@
-import requests
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import client
+import codec
+from catalog_file import CATALOG_FILE, CatalogWriter, StreamedCourses
+from catalog_db import CatalogDB
 
-def get_course_list(session_info, batch_id=None, campus='01', class_type='FANKC'):
-    """获取所有课程列表并保存到save.json"""
+def fetch_page(headers, json_data, page, retries=3):
+    """
+    获取单页课程数据，失败时单独重试该页
+    :return: (该页课程列表, 成功那次请求的耗时)
+    :raises RuntimeError: 重试次数用完仍失败
+    """
+    json_data = {**json_data, 'pageNumber': page}
+    error = None
+    for attempt in range(1, retries + 1):
+        start = time.time()
+        try:
+            response = client.post(
+                '/xsxk/elective/clazz/list',
+                headers=headers,
+                json=json_data,
+            )
+            if response.status_code == 200:
+                page_data = codec.loads(response.content)
+                if page_data.get('code') == 200:
+                    return page_data.get('data', {}).get('rows', []), time.time() - start
+                error = page_data.get('msg', '未知错误')
+            else:
+                error = f"状态码: {response.status_code}"
+        except Exception as e:
+            error = str(e)
+        print(f"获取第{page}页失败({attempt}/{retries}): {error}")
+        if attempt < retries:
+            time.sleep(0.5 * attempt)
+    raise RuntimeError(f"第{page}页重试{retries}次后仍失败: {error}")
+
+def get_course_list(session_info, batch_id=None, campus='01', class_type='FANKC', concurrency=4, retries=3, db_path=None):
+    """
+    获取所有课程列表并保存到save.jsonl
+    第1页确定总页数后，其余页面按concurrency并发获取，每页按页码顺序到达后立即写入文件，
+    获取过程中内存里只保留正在写入的一页；是否把整个列表载入内存由调用方决定
+    :param db_path: SQLite课程库路径，提供时同时保存为一个新快照
+    :return: 逐行读取save.jsonl的课程列表(StreamedCourses)，失败时返回None且保留原文件
+    """
     if not batch_id:
         print("错误:未提供批次ID")
-        return False
+        return None
 
     print("\n正在获取课程列表...")
     print(f"使用批次ID: {batch_id}")
     print(f"校区: {campus}")
     print(f"课程类型: {class_type}")
     
-    # 使用Session保持会话
-    session = requests.Session()
-    session.cookies.update(session_info.get('cookies', {}))
+    # 使用全局会话复用连接
+    client.set_auth(session_info)
     
     headers = {
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
-        'Authorization': session_info.get('Authorization', ''),
-        'Connection': 'keep-alive',
         'Content-Type': 'application/json;charset=UTF-8',
-        'Origin': 'http://jwxk.ctgu.edu.cn',
-        'Referer': f'http://jwxk.ctgu.edu.cn/xsxk/elective/grablessons?batchId={batch_id}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+        'Origin': client.BASE_URL,
+        'Referer': client.url(f'/xsxk/elective/grablessons?batchId={batch_id}'),
     }
 
     # 初始化变量
-    all_courses = []
     page_number = 1
     page_size = 100  # 每页获取100条记录
     total_pages = 1
+    db = CatalogDB(db_path) if db_path else None
+    snapshot_id = None
     
     try:
         # 首先获取第一页以确定总页数
@@ -44,100 +79,91 @@ def get_course_list(session_info, batch_id=None, campus='01', class_type='FANKC'
             'campus': campus,
         }
         
-        response = session.post(
-            'http://jwxk.ctgu.edu.cn/xsxk/elective/clazz/list',  
+        fetch_start = time.time()
+        response = client.post(
+            '/xsxk/elective/clazz/list',
             headers=headers,
             json=json_data,
-            verify=False,  
         )
         
         if response.status_code == 200:
-            data = response.json()
+            data = codec.loads(response.content)
             if data.get('code') == 200:
+                first_latency = time.time() - fetch_start
                 course_data = data.get('data', {})
                 rows = course_data.get('rows', [])
                 total = course_data.get('total', 0)
                 total_pages = (total + page_size - 1) // page_size  # 计算总页数
                 
                 print(f"总课程数: {total}, 总页数: {total_pages}")
+                print(f"第1页耗时: {first_latency:.2f}秒")
                 
-                # 添加第一页课程
-                all_courses.extend(rows)
-                
-                # 获取剩余页面的数据
-                for page in range(2, total_pages + 1):
-                    print(f"获取第{page}页数据...")
-                    json_data['pageNumber'] = page
+                # 逐页写入文件，不必等全部页面获取完成
+                with CatalogWriter(CATALOG_FILE) as writer:
+                    if db:
+                        snapshot_id = db.begin_snapshot(batch_id, campus, class_type)
                     
-                    response = session.post(
-                        'http://jwxk.ctgu.edu.cn/xsxk/elective/clazz/list',  
-                        headers=headers,
-                        json=json_data,
-                        verify=False,  
-                    )
+                    def save_page(page_rows):
+                        writer.write_page(page_rows)
+                        if db:
+                            db.add_rows(snapshot_id, page_rows)
                     
-                    if response.status_code == 200:
-                        page_data = response.json()
-                        if page_data.get('code') == 200:
-                            page_courses = page_data.get('data', {}).get('rows', [])
-                            all_courses.extend(page_courses)
-                        else:
-                            print(f"获取第{page}页失败: {page_data.get('msg', '未知错误')}")
-                    else:
-                        print(f"获取第{page}页失败，状态码: {response.status_code}")
-                
-                # 构建最终数据结构
-                final_data = {
-                    'code': 200,
-                    'msg': '成功',
-                    'data': {
-                        'pageNumber': 1,
-                        'pageSize': total,
-                        'rows': all_courses,
-                        'total': total
-                    }
-                }
-                
-                # 保存所有课程数据到save.json
-                with open('save.json', 'w', encoding='utf-8') as f:
-                    json.dump(final_data, f, ensure_ascii=False, indent=2)
-                print(f"成功获取 {len(all_courses)} 门课程，已保存到save.json")
+                    # 添加第一页课程
+                    save_page(rows)
+                    serial_time = first_latency
+                    
+                    # 并发获取剩余页面，map按页码顺序返回结果
+                    if total_pages > 1:
+                        print(f"并发获取第2-{total_pages}页数据(并发数: {concurrency})...")
+                        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                            results = executor.map(
+                                lambda page: fetch_page(headers, json_data, page, retries),
+                                range(2, total_pages + 1),
+                            )
+                            for page, (page_courses, latency) in enumerate(results, 2):
+                                print(f"第{page}页耗时: {latency:.2f}秒")
+                                save_page(page_courses)
+                                serial_time += latency
+                    
+                    if db:
+                        # 全部页面写入后快照才可被查询
+                        db.finish_snapshot(snapshot_id)
                 
-                # 根据实际响应结构调整数据
-                for course in all_courses:
-                    # 确保每个课程都有classList字段
-                    if 'classList' not in course:
-                        course['classList'] = []
+                # 各页耗时之和即逐页串行获取所需的时间
+                print(f"课程列表获取总耗时: {time.time() - fetch_start:.2f}秒 (逐页串行约需 {serial_time:.2f}秒)")
+                print(f"成功获取 {writer.count} 门课程，已保存到{CATALOG_FILE}")
+                if db:
+                    print(f"已写入课程库 {db_path} (快照 {snapshot_id})")
                 
-                return True
+                return StreamedCourses(CATALOG_FILE)
             else:
                 print(f"获取课程列表失败: {data.get('msg', '未知错误')}")
-                return False
+                return None
         else:
             print(f"请求失败，状态码: {response.status_code}")
             print(f"响应内容: {response.text[:200]}...")
-            return False
+            return None
             
     except Exception as e:
         print(f"获取课程列表时发生错误: {str(e)}")
-        return False
+        # 丢弃不完整的快照
+        if snapshot_id:
+            db.drop_snapshot(snapshot_id)
+        return None
+    finally:
+        if db:
+            db.close()
 
 def verify_session(session_info, batch_id='', campus='01'):
     """验证会话是否有效（专用于会话验证）"""
     try:
-        # 使用Session保持会话
-        session = requests.Session()
-        session.cookies.update(session_info.get('cookies', {}))
+        # 使用全局会话复用连接
+        client.set_auth(session_info)
         
         headers = {
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
-            'Authorization': session_info.get('Authorization', ''),
-            'Connection': 'keep-alive',
             'Content-Type': 'application/json;charset=UTF-8',
-            'Origin': 'http://jwxk.ctgu.edu.cn',
-            'Referer': f'http://jwxk.ctgu.edu.cn/xsxk/elective/grablessons?batchId={batch_id}',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+            'Origin': client.BASE_URL,
+            'Referer': client.url(f'/xsxk/elective/grablessons?batchId={batch_id}'),
         }
 
         # 最小化的请求参数 - 仅用于验证会话
@@ -149,16 +175,15 @@ def verify_session(session_info, batch_id='', campus='01'):
             'campus': campus,
         }
 
-        response = session.post(
-            'http://jwxk.ctgu.edu.cn/xsxk/elective/clazz/list',  
+        response = client.post(
+            '/xsxk/elective/clazz/list',
             headers=headers,
             json=json_data,
-            verify=False,  
         )
         #print(f"[会话验证] 响应内容: {response.text}")
 
         if response.status_code == 200:
-            data = response.json()
+            data = codec.loads(response.content)
             if data.get('code') == 200:
                 return True
             elif data.get('code') == 500 and "本轮次选课暂未开始" in data.get('msg', ''):
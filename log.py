@@ -0,0 +1,79 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 抢课过程的日志，发送线程只把记录放入队列，由后台线程统一写到控制台和日志文件
+logger = logging.getLogger('grab')
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+
+# 未启动后台写入时直接输出到控制台
+_direct = logging.StreamHandler(sys.stdout)
+_direct.setLevel(logging.INFO)
+logger.addHandler(_direct)
+
+_listener = None
+_queue_handler = None
+
+class DeferredQueueHandler(QueueHandler):
+    """只把原始记录放入队列，消息的格式化留给写入线程完成"""
+
+    def prepare(self, record):
+        return record
+
+def parse_level(value, default=logging.INFO):
+    """把配置中的日志级别(如INFO、debug、20)转换为logging级别"""
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value or '').upper())
+    return level if isinstance(level, int) else default
+
+def start(config):
+    """
+    启动后台写入线程
+    控制台按log_level输出，log_file非空时另外把所有级别写入滚动日志文件
+    """
+    global _listener, _queue_handler
+    if _listener:
+        return
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(parse_level(config.get('log_level', 'INFO')))
+    handlers = [console]
+
+    log_file = config.get('log_file')
+    if log_file:
+        try:
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=int(float(config.get('log_max_mb', 5)) * 1024 * 1024),
+                backupCount=3,
+                encoding='utf-8',
+            )
+        except OSError as e:
+            print(f"无法打开日志文件 {log_file}: {e}")
+        else:
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(logging.Formatter('%(asctime)s [%(threadName)s] %(levelname)s %(message)s'))
+            handlers.append(file_handler)
+
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _queue_handler = DeferredQueueHandler(records)
+    _listener.start()
+    logger.addHandler(_queue_handler)
+    logger.removeHandler(_direct)
+
+def stop():
+    """写完队列中剩余的记录后停止后台写入线程，恢复直接输出"""
+    global _listener, _queue_handler
+    if not _listener:
+        return
+    logger.addHandler(_direct)
+    logger.removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
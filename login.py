@@ -1,20 +1,16 @@
-import requests
 import base64
 import os
+import client
 
-# 登录URL和验证码URL
-login_url = 'http://jwxk.ctgu.edu.cn/xsxk/auth/login'
-captcha_url = 'http://jwxk.ctgu.edu.cn/xsxk/auth/captcha'
-
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
-}
+# 登录路径和验证码路径
+login_url = '/xsxk/auth/login'
+captcha_url = '/xsxk/auth/captcha'
 
 def get_captcha():
     """获取验证码图片和uuid"""
     try:
         # 发送POST请求获取验证码
-        response = requests.post(captcha_url, headers=headers)
+        response = client.post(captcha_url)
         response.raise_for_status()  # 检查请求是否成功
         
         # 解析JSON响应
@@ -47,6 +43,41 @@ def get_captcha():
         print(f"获取验证码时发生错误: {str(e)}")
         return None, None
 
+_ocr = None
+
+def recognize_captcha(img_data):
+    """用ddddocr识别验证码，未安装时返回None"""
+    global _ocr
+    if _ocr is None:
+        try:
+            # 导入较慢，只在需要识别时导入
+            import ddddocr
+        except ImportError:
+            print("未安装ddddocr，无法自动识别验证码(pip install ddddocr)")
+            return None
+        try:
+            _ocr = ddddocr.DdddOcr(show_ad=False)
+        except TypeError:  # 旧版本没有show_ad参数
+            _ocr = ddddocr.DdddOcr()
+    captcha = _ocr.classification(img_data)
+    print(f"自动识别验证码: {captcha}")
+    return captcha
+
+def solve_captcha(img_data, config):
+    """
+    获取验证码字符：配置了captcha_ocr时自动识别，headless(无头模式或抢课中重新登录)时不等待输入
+    :return: 验证码，无法获得时返回None
+    """
+    if config.get('captcha_ocr'):
+        captcha = recognize_captcha(img_data)
+        if captcha:
+            return captcha
+    if config.get('headless'):
+        print("当前不能等待输入验证码，请开启captcha_ocr(需安装ddddocr)或先用main.py登录保存会话")
+        return None
+    # 让用户输入验证码
+    return input("请输入验证码图片中的字符: ")
+
 def login(config):
     """登录函数"""
     # 获取验证码
@@ -54,8 +85,9 @@ def login(config):
     if not img_data:
         return
         
-    # 让用户输入验证码
-    captcha = input("请输入验证码图片中的字符: ")
+    captcha = solve_captcha(img_data, config)
+    if captcha is None:
+        return None
     
     # 使用配置中的学号和密码
     data = {
@@ -69,7 +101,7 @@ def login(config):
     
     # 提交登录请求
     try:
-        resp = requests.post(login_url, headers=headers, data=data)
+        resp = client.post(login_url, data=data)
         print("登录结果:", resp.status_code)
         
         # 检查登录是否成功
@@ -1,5 +1,6 @@
 from heartbeat import keep_session_alive
 from login import login  
+from client import init_client
 from function import (
     load_config,
     select_batch,
@@ -19,6 +20,15 @@ def main():
     print(f"  抢课间隔: {config['grab_interval']}秒")
     print(f"  并发数: {config['max_workers']}")
     print(f"  校区: {config['campus']}")
+
+    # 初始化全局HTTP客户端，连接池大小与并发数匹配
+    init_client(config)
+
+    # 配置了多个账号时进入多账号模式
+    if config.get('accounts'):
+        import accounts
+        accounts.main(config)
+        return
     
     # 2. 自动登录
     print("正在登录系统...")
@@ -61,7 +71,7 @@ def main():
                 print("没有已保存的课程信息，请先选择课程")
                 continue
                 
-            selected_courses, continue_selection = run_course_selection(selected_courses, config)
+            selected_courses, continue_selection = run_course_selection(selected_courses, config, session_info)
             if continue_selection:
                 continue
         
@@ -71,7 +81,7 @@ def main():
             )
         
         elif choice == "3":  # 查看/管理已保存的课程
-            selected_courses = view_and_manage_saved_courses(selected_courses)
+            selected_courses = view_and_manage_saved_courses(selected_courses, config.get('catalog_db'))
 
         elif choice == "4":  # 退出程序
             print("\n程序结束")
@@ -0,0 +1,240 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from log import logger
+
+# 延迟直方图的桶上界(秒)
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1, 2, 5, 10)
+
+# 正在运行的抢课任务的指标，由请求路径记录，未运行时为None
+active = None
+
+class Histogram:
+    """固定分桶的延迟直方图，分位数按桶内线性插值估算"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶是+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        """累加另一个相同分桶的直方图"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """估算分位数，没有样本时返回None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i else 0
+                # 超出最大桶的样本无法插值，按最大桶上界计
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+def code_label(result):
+    """请求结果的统计标签：响应code，无法解析时用HTTP状态码，请求失败时为error"""
+    if result.code is not None:
+        return str(result.code)
+    if result.status is not None:
+        return f"http{result.status}"
+    return 'error'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """
+    抢课请求指标：按课程和全局统计请求数(按响应code)、延迟直方图和在途请求数
+    可以每隔一段时间打印一行状态，并通过本地HTTP端口提供Prometheus文本格式
+    """
+
+    def __init__(self):
+        self.requests = Counter()  # {(课程, 标签): 次数}
+        self.in_flight = Counter()  # {课程: 在途请求数}
+        self.latency = {}  # {课程: Histogram}
+        self.total_latency = Histogram()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def begin(self, course):
+        """记录一个请求开始发送"""
+        with self._lock:
+            self.in_flight[course] += 1
+
+    def end(self, course, result):
+        """记录一个请求结束"""
+        with self._lock:
+            self.in_flight[course] -= 1
+            self.requests[(course, code_label(result))] += 1
+            if result.latency is not None:
+                self.latency.setdefault(course, Histogram()).observe(result.latency)
+                self.total_latency.observe(result.latency)
+
+    def export(self):
+        """导出当前数据的副本，可以跨进程传递"""
+        with self._lock:
+            latency = {}
+            for course, histogram in self.latency.items():
+                latency[course] = Histogram(histogram.buckets)
+                latency[course].merge(histogram)
+            total_latency = Histogram(self.total_latency.buckets)
+            total_latency.merge(self.total_latency)
+            return {
+                'requests': dict(self.requests),
+                'in_flight': dict(self.in_flight),
+                'latency': latency,
+                'total_latency': total_latency,
+            }
+
+    def load(self, snapshots):
+        """用多个进程导出的数据替换当前数据(进程分片模式下父进程汇总各分片)"""
+        requests, in_flight, latency, total_latency = Counter(), Counter(), {}, Histogram()
+        for snapshot in snapshots:
+            requests.update(snapshot['requests'])
+            in_flight.update(snapshot['in_flight'])
+            for course, histogram in snapshot['latency'].items():
+                latency.setdefault(course, Histogram()).merge(histogram)
+            total_latency.merge(snapshot['total_latency'])
+        with self._lock:
+            self.requests, self.in_flight = requests, in_flight
+            self.latency, self.total_latency = latency, total_latency
+
+    def totals(self):
+        """全局的请求总数、在途请求数和各标签次数"""
+        with self._lock:
+            by_code = Counter()
+            for (_, label), count in self.requests.items():
+                by_code[label] += count
+            return sum(by_code.values()), sum(self.in_flight.values()), by_code
+
+    def status_line(self, qps):
+        total, in_flight, by_code = self.totals()
+        with self._lock:
+            p50 = self.total_latency.quantile(0.5)
+            p99 = self.total_latency.quantile(0.99)
+        latency = f"p50 {p50 * 1000:.0f}ms p99 {p99 * 1000:.0f}ms" if p50 is not None else "暂无"
+        codes = " ".join(f"{label}:{count}" for label, count in sorted(by_code.items()))
+        return f"[状态] {qps:.1f} 请求/秒 | 共 {total} 次 | 在途 {in_flight} | 延迟 {latency} | {codes}"
+
+    def _report_loop(self, interval):
+        last_total, last_time = 0, time.time()
+        while not self._stop.wait(interval):
+            total = self.totals()[0]
+            now = time.time()
+            logger.info("%s", self.status_line((total - last_total) / max(now - last_time, 1e-6)))
+            last_total, last_time = total, now
+
+    def prometheus_text(self):
+        """Prometheus文本格式的指标"""
+        lines = [
+            "# HELP grab_requests_total 选课请求数(按课程和响应code)",
+            "# TYPE grab_requests_total counter",
+        ]
+        with self._lock:
+            for (course, label), count in sorted(self.requests.items()):
+                lines.append(f'grab_requests_total{{course="{_escape(course)}",code="{label}"}} {count}')
+            lines += [
+                "# HELP grab_in_flight 在途选课请求数",
+                "# TYPE grab_in_flight gauge",
+            ]
+            for course, count in sorted(self.in_flight.items()):
+                lines.append(f'grab_in_flight{{course="{_escape(course)}"}} {count}')
+            lines += [
+                "# HELP grab_latency_seconds 选课请求延迟",
+                "# TYPE grab_latency_seconds histogram",
+            ]
+            histograms = [(f'course="{_escape(course)}"', h) for course, h in sorted(self.latency.items())]
+            histograms.append(('course="_all"', self.total_latency))
+            for labels, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'grab_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'grab_latency_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'grab_latency_seconds_count{{{labels}}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host='127.0.0.1'):
+        """在本地端口提供/metrics"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"[指标] 无法监听端口 {port}: {e}")
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"[指标] Prometheus指标: http://{host}:{port}/metrics")
+
+    def start(self, interval=1, port=0):
+        """
+        启动状态行和指标端口
+        :param interval: 状态行刷新间隔(秒)，0为不打印
+        :param port: 指标端口，0为不启用
+        """
+        if interval:
+            self._thread = threading.Thread(target=self._report_loop, args=(interval,), daemon=True)
+            self._thread.start()
+        if port:
+            self.serve(port)
+
+    def stop(self):
+        """停止状态行和指标端口，并打印整个过程的统计"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        total = self.totals()[0]
+        if total:
+            elapsed = max(time.time() - self.started_at, 1e-6)
+            print(self.status_line(total / elapsed).replace("[状态]", "[指标汇总]"))
+
+def create(config):
+    """按配置创建指标并设为当前指标"""
+    global active
+    active = Metrics()
+    active.start(config.get('metrics_interval', 1), int(config.get('metrics_port') or 0))
+    return active
+
+def close(metrics):
+    """停止指标并清除当前指标"""
+    global active
+    metrics.stop()
+    if active is metrics:
+        active = None
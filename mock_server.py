@@ -0,0 +1,295 @@
+"""
+本地模拟选课系统，提供验证码、登录、课程列表、选课和服务器时间接口
+用法: python mock_server.py [--port 8765] [--latency 0.05] [--error-rate 0.02] [--capacity 30] [--open-in 10] [--token-ttl 600]
+然后在config.yaml中设置 base_url: http://127.0.0.1:8765
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# 1x1像素的PNG，作为验证码图片
+CAPTCHA_PNG = base64.b64encode(bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082'
+)).decode()
+
+BATCH_ID = 'MOCK-BATCH'
+
+def make_synthetic_rows(n_courses=3000, classes_per_course=6, flat_ratio=0.2, seed=0):
+    """生成模拟的clazz/list课程行，flat_ratio比例为素质拓展选修课"""
+    rng = random.Random(seed)
+    teachers = [f"教师{i}" for i in range(n_courses // 4 + 1)]
+    units = [f"学院{i}" for i in range(30)]
+    rows = []
+    for i in range(n_courses):
+        base = {
+            "KCH": f"K{i:06d}",
+            "KCM": f"课程{i}",
+            "KKDW": rng.choice(units),
+        }
+        if rng.random() < flat_ratio:
+            krl = rng.randint(30, 120)
+            rows.append({
+                **base,
+                "XGXKLB": "素质拓展选修课",
+                "JXBID": f"J{i:06d}00",
+                "secretVal": "x" * 64,
+                "SKJS": rng.choice(teachers),
+                "KXH": "01",
+                "teachingPlace": "1-16周 星期一第1-2节 教学楼A101",
+                "KRL": krl,
+                "YXRS": rng.randint(0, krl),
+            })
+            continue
+        tc_list = []
+        for j in range(classes_per_course):
+            krl = rng.randint(30, 120)
+            tc_list.append({
+                "JXBID": f"J{i:06d}{j:02d}",
+                "secretVal": "x" * 64,
+                "KCM": base["KCM"],
+                "SKJS": rng.choice(teachers),
+                "KXH": f"{j + 1:02d}",
+                "teachingPlace": f"1-16周 星期{'一二三四五'[j % 5]}第{2 * j % 10 + 1}-{2 * j % 10 + 2}节",
+                "KRL": krl,
+                "YXRS": rng.randint(0, krl),
+            })
+        rows.append({**base, "tcList": tc_list})
+    return rows
+
+class MockState:
+    """
+    模拟服务器的状态：课程、教学班余量、已发放的token和各学生已选的教学班
+    :param latency: 每个请求的基础延迟(秒)
+    :param jitter: 在基础延迟上随机增加的最大延迟(秒)
+    :param error_rate: 返回502网关错误的概率
+    :param capacity: 每个教学班的课容量，为None时使用生成的随机容量
+    :param open_at: 开始选课的时间戳，之前选课返回"本轮次选课暂未开始"
+    :param token_ttl: token有效期(秒)，过期后返回401
+    :param courses: 生成的课程数
+    :param captcha: 登录时需要输入的验证码，为空时接受任意验证码
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, capacity=None, open_at=None,
+                 token_ttl=3600, courses=300, captcha='', seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.open_at = open_at or 0
+        self.token_ttl = token_ttl
+        self.captcha = captcha
+        self.rows = make_synthetic_rows(courses, seed=seed)
+        self.classes = {}  # {教学班ID: 教学班信息}，与rows中的字典是同一对象，余量变化在列表中可见
+        for row in self.rows:
+            for class_info in ([row] if 'JXBID' in row else row['tcList']):
+                if capacity is not None:
+                    class_info['KRL'] = capacity
+                    class_info['YXRS'] = 0
+                self.classes[class_info['JXBID']] = class_info
+        self.tokens = {}  # {token: (学号, 发放时间)}
+        self.selected = {}  # {学号: {教学班ID}}
+        self.counts = {}  # {接口: 请求次数}
+        self.add_codes = {}  # {选课响应code: 次数}
+        self.first_success_at = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def issue_token(self, username='mock'):
+        """发放一个token，基准测试可以跳过验证码直接使用"""
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.tokens[token] = (username, time.time())
+        return token
+
+    def user_of(self, authorization):
+        """根据Authorization找到学号，token无效或过期时返回None"""
+        token = (authorization or '').replace('Bearer ', '', 1)
+        with self._lock:
+            entry = self.tokens.get(token)
+        if not entry or time.time() - entry[1] > self.token_ttl:
+            return None
+        return entry[0]
+
+    def count(self, path):
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def record_add(self, code):
+        with self._lock:
+            self.add_codes[code] = self.add_codes.get(code, 0) + 1
+
+    def delay(self):
+        """本次请求的延迟，以及是否返回网关错误"""
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+        return delay, failed
+
+    def add(self, username, clazz_id, secret_val):
+        """选课，返回(code, msg)"""
+        if time.time() < self.open_at:
+            return 500, '本轮次选课暂未开始'
+        with self._lock:
+            class_info = self.classes.get(clazz_id)
+            if class_info is None or class_info.get('secretVal') != secret_val:
+                return 500, '参数校验不通过'
+            chosen = self.selected.setdefault(username, set())
+            if clazz_id in chosen:
+                return 500, '该课程已在选课结果中'
+            if int(class_info['YXRS']) >= int(class_info['KRL']):
+                return 500, '该课程已满，选课失败'
+            class_info['YXRS'] = int(class_info['YXRS']) + 1
+            chosen.add(clazz_id)
+            if self.first_success_at is None:
+                self.first_success_at = time.time()
+            return 200, '选课成功'
+
+    def list_rows(self, key='', page=1, page_size=10):
+        """按课程名关键字分页查询课程"""
+        rows = [row for row in self.rows if key in row['KCM']] if key else self.rows
+        start = (max(page, 1) - 1) * page_size
+        return rows[start:start + page_size], len(rows)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持长连接
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(raw or '{}')
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+    def do_POST(self):
+        state = self.server.state
+        path = self.path.split('?')[0]
+        data = self.read_body()
+        state.count(path)
+
+        delay, failed = state.delay()
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            self.reply({'code': 502, 'msg': 'Bad Gateway'}, status=502)
+            return
+
+        if path == '/xsxk/auth/captcha':
+            self.reply({'code': 200, 'msg': '操作成功', 'data': {
+                'captcha': f'data:image/png;base64,{CAPTCHA_PNG}',
+                'uuid': uuid.uuid4().hex,
+            }})
+        elif path == '/xsxk/auth/login':
+            if not data.get('loginname') or (state.captcha and data.get('captcha') != state.captcha):
+                self.reply({'code': 500, 'msg': '验证码错误'})
+                return
+            token = state.issue_token(data['loginname'])
+            self.reply({'code': 200, 'msg': '登录成功', 'data': {
+                'token': token,
+                'student': {'XH': data['loginname'], 'electiveBatchList': [{
+                    'code': BATCH_ID,
+                    'name': '模拟选课批次',
+                    'beginTime': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(state.open_at or time.time())),
+                    'endTime': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() + 86400)),
+                }]},
+            }}, headers={'Set-Cookie': f'JSESSIONID={uuid.uuid4().hex}; Path=/'})
+        elif path == '/xsxk/web/now':
+            self.reply({'code': 200, 'msg': '操作成功', 'data': {
+                'currentTime': int(time.time() * 1000),
+                'onlineCount': len(state.tokens),
+            }})
+        elif path in ('/xsxk/elective/clazz/list', '/xsxk/elective/clazz/add'):
+            username = state.user_of(self.headers.get('Authorization'))
+            if username is None:
+                self.reply({'code': 401, 'msg': '登录已过期，请重新登录'})
+            elif path.endswith('/list'):
+                rows, total = state.list_rows(
+                    data.get('KEY', ''), int(data.get('pageNumber', 1)), int(data.get('pageSize', 10)),
+                )
+                self.reply({'code': 200, 'msg': '操作成功', 'data': {'rows': rows, 'total': total}})
+            else:
+                code, msg = state.add(username, data.get('clazzId'), data.get('secretVal'))
+                state.record_add(code)
+                self.reply({'code': code, 'msg': msg, 'data': None})
+        else:
+            self.reply({'code': 404, 'msg': '接口不存在'}, status=404)
+
+class MockServer:
+    """在后台线程中运行的模拟服务器，参数同MockState"""
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.state = MockState(**options)
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟选课系统")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的基础延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="随机附加的最大延迟(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回502的概率")
+    parser.add_argument("--capacity", type=int, default=None, help="每个教学班的课容量，默认随机")
+    parser.add_argument("--open-in", type=float, default=0, help="多少秒后开始选课")
+    parser.add_argument("--token-ttl", type=float, default=3600, help="token有效期(秒)")
+    parser.add_argument("--courses", type=int, default=300, help="生成的课程数")
+    parser.add_argument("--captcha", default="", help="登录需要的验证码，默认接受任意值")
+    args = parser.parse_args()
+
+    server = MockServer(
+        args.host, args.port,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        capacity=args.capacity, open_at=time.time() + args.open_in if args.open_in else None,
+        token_ttl=args.token_ttl, courses=args.courses, captcha=args.captcha,
+    )
+    print(f"模拟选课系统已启动: {server.base_url} (批次ID: {BATCH_ID})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"请求统计: {server.state.counts}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import re
+import threading
+from collections import Counter
+from rate import GATEWAY_ERRORS
+
+SUCCESS = 'success'          # 选课成功
+HELD = 'held'                # 已经选上，无需再抢
+RETRY = 'retry'              # 暂时抢不到，按间隔继续
+FULL = 'full'                # 教学班已满，按间隔继续；有备选班级时改为主抢下一个
+RETRY_LATER = 'retry_later'  # 服务器繁忙或限流，放慢后继续
+TERMINAL = 'terminal'        # 无论重试多少次都选不上，立即放弃
+
+OUTCOME_NAMES = {
+    SUCCESS: '选课成功',
+    HELD: '已选上',
+    RETRY: '继续重试',
+    FULL: '已满',
+    RETRY_LATER: '稍后重试',
+    TERMINAL: '无法选上',
+}
+
+# 默认规则: (响应code, msg正则, 结果)，按顺序取第一条匹配的规则，code为None时匹配任意code
+DEFAULT_RULES = [
+    (200, None, SUCCESS),
+    (None, r'已在选课结果|已选过|已经选|重复选', HELD),
+    # 开放前的提示(如"不在选课时间范围内")要排在无法选上的规则之前，否则会被当作"不在...范围"放弃
+    (None, r'未开始|不在.*时间', RETRY),
+    (None, r'冲突', TERMINAL),
+    (None, r'参数校验不通过', TERMINAL),
+    (None, r'学分.*(超|上限|已满)|不在.*范围|不允许|无权', TERMINAL),
+    (None, r'频繁|稍后|繁忙', RETRY_LATER),
+    (None, r'已满|容量', FULL),
+]
+
+class OutcomeTable:
+    """
+    选课响应分类表，把响应code和msg映射为结果类型，并统计各类结果的次数
+    配置中的outcome_rules排在默认规则之前，可以覆盖默认分类
+    """
+
+    def __init__(self, extra_rules=None):
+        self.rules = []
+        for rule in extra_rules or []:
+            try:
+                self.rules.append(self._compile(rule.get('code'), rule.get('msg'), rule.get('outcome')))
+            except (AttributeError, ValueError, re.error) as e:
+                print(f"忽略无效的响应分类规则 {rule}: {e}")
+        self.rules.extend(self._compile(*rule) for rule in DEFAULT_RULES)
+        self.counts = Counter()
+        self.final = {}  # {课程名: (结果, msg)}，只记录成功、已选上和无法选上的课程
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _compile(code, pattern, outcome):
+        if outcome not in OUTCOME_NAMES:
+            raise ValueError(f"未知的结果类型 {outcome}")
+        return (
+            None if code is None else int(code),
+            re.compile(pattern) if pattern else None,
+            outcome,
+        )
+
+    def classify(self, status, code, msg):
+        """
+        对一次响应分类
+        :param status: HTTP状态码，请求失败时为None
+        :param code: 响应中的code，无法解析时为None
+        :param msg: 响应中的msg
+        :return: 结果类型
+        """
+        if status in GATEWAY_ERRORS:
+            return RETRY_LATER
+        if code is None:
+            # 请求失败或响应无法解析，按普通重试处理
+            return RETRY
+        for rule_code, pattern, outcome in self.rules:
+            if rule_code is not None and rule_code != code:
+                continue
+            if pattern is not None and not pattern.search(msg or ''):
+                continue
+            return outcome
+        return RETRY
+
+    def record(self, course_name, result):
+        """记录一次请求结果"""
+        with self._lock:
+            self.counts[result.outcome] += 1
+            if result.outcome in (SUCCESS, HELD, TERMINAL):
+                self.final[course_name] = (result.outcome, result.msg)
+
+    def merge(self, counts, final):
+        """累加其他进程的统计"""
+        with self._lock:
+            self.counts.update(counts)
+            self.final.update(final)
+
+    def report(self):
+        """打印各类结果的次数和各课程的最终结果"""
+        if not self.counts:
+            return
+        print("\n[响应统计] " + ", ".join(
+            f"{OUTCOME_NAMES[outcome]} {self.counts[outcome]} 次"
+            for outcome in OUTCOME_NAMES if self.counts[outcome]
+        ))
+        for course_name, (outcome, msg) in self.final.items():
+            print(f"  {course_name}: {OUTCOME_NAMES[outcome]} - {msg}")
+
+def create_table(config):
+    """按配置创建响应分类表"""
+    return OutcomeTable(config.get('outcome_rules'))
+
+# 未提供分类表时使用的默认表
+default_table = OutcomeTable()
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import client
+import clock
+
+class Prewarmer:
+    """
+    连接预热：在开抢前建立并维持一批长连接
+    每轮同时发出connections个轻量请求，迫使连接池为每个请求各占一条连接，
+    请求结束后连接回到池中，开抢时各线程直接复用
+    """
+
+    def __init__(self, connections, interval=5):
+        self.connections = max(1, int(connections))
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ping(self, barrier):
+        try:
+            # 所有线程就绪后同时发出，保证请求重叠
+            barrier.wait(timeout=2)
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            client.post(
+                "/xsxk/web/now",
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Referer": client.url("/xsxk/profile/index.html"),
+                }
+            )
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        """发出一轮并发轻量请求，返回成功的连接数"""
+        barrier = threading.Barrier(self.connections)
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            results = list(executor.map(self._ping, [barrier] * self.connections))
+        return sum(results)
+
+    def _loop(self, until):
+        rounds = 0
+        while not self._stop.is_set() and clock.now() < until:
+            start = time.time()
+            warmed = self.warm()
+            rounds += 1
+            if rounds == 1:
+                print(f"[预热] 已建立 {warmed}/{self.connections} 条长连接，耗时 {time.time() - start:.2f}秒")
+            # 不越过开抢时间，到点后把连接全部留给抢课线程
+            remaining = until - clock.now()
+            self._stop.wait(min(self.interval, max(remaining, 0)))
+        print(f"[预热] 结束，共预热 {rounds} 轮")
+
+    def start(self, until):
+        """启动预热线程，持续保活到服务器时间until"""
+        ip = client.pin_host()
+        if ip:
+            print(f"[预热] 已固定 {client.BASE_URL} 解析地址: {ip}")
+        self._thread = threading.Thread(target=self._loop, args=(until,), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """停止预热"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,137 @@
+import csv
+import threading
+import time
+from collections import deque
+
+# 说明服务器处理正常、只是暂时抢不到的提示，此时可以加快请求
+FAST_RETRY_HINTS = ("未开始", "时间范围", "已满", "容量")
+
+# 网关错误说明服务器过载，需要退避
+GATEWAY_ERRORS = (502, 503, 504)
+
+# 每门课程保留的间隔变化记录条数，长时间抢课时只保留最近的
+HISTORY_SIZE = 10000
+
+# 正在运行的抢课任务的全局请求速率上限，未设置时为None
+budget = None
+
+class AdaptiveInterval:
+    """
+    单门课程的自适应请求间隔(AIMD)
+    响应快且提示"未开始"/"已满"时，间隔线性减小step；
+    响应慢于target_latency、网关错误或请求失败时，间隔乘以backoff
+    """
+
+    def __init__(self, initial, min_interval=0.3, max_interval=5, target_latency=0.8, step=0.1, backoff=2,
+                 history_size=HISTORY_SIZE):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_latency = target_latency
+        self.step = step
+        self.backoff = backoff
+        self.interval = min(max(initial, min_interval), max_interval)
+        # 最近history_size次的(时间, 间隔, 耗时, 响应码)
+        self.history = deque([(time.time(), self.interval, None, None)], maxlen=history_size)
+        # 全部间隔的统计，不受history长度限制: [最小, 最大, 总和, 次数]
+        self._stats = [self.interval, self.interval, self.interval, 1]
+        self._lock = threading.Lock()  # 同一课程的多个发送线程共用一个控制器
+
+    def update(self, latency=None, status=None, code=None, msg=''):
+        """
+        根据一次请求的结果调整间隔
+        :param latency: 请求耗时(秒)，请求失败时为None
+        :param status: HTTP状态码
+        :param code: 响应中的code
+        :param msg: 响应中的msg
+        :return: 新的间隔
+        """
+        with self._lock:
+            if latency is None or status in GATEWAY_ERRORS or latency > self.target_latency:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            elif any(hint in (msg or '') for hint in FAST_RETRY_HINTS):
+                self.interval = max(self.interval - self.step, self.min_interval)
+            self.history.append((time.time(), self.interval, latency, code if code is not None else status))
+            stats = self._stats
+            stats[0] = min(stats[0], self.interval)
+            stats[1] = max(stats[1], self.interval)
+            stats[2] += self.interval
+            stats[3] += 1
+            return self.interval
+
+    def summary(self):
+        """间隔的最小、平均、最大值"""
+        low, high, total, count = self._stats
+        return low, total / count, high
+
+class RateBudget:
+    """
+    全局请求速率上限(令牌桶)，所有课程、所有账号的选课请求共用
+    每秒补充rate个令牌，最多积累burst个，发送前取不到令牌时等待
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst or rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        尝试取一个令牌，不等待
+        :return: 取到时返回0，否则返回还需等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """取一个令牌，必要时等待"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+def create_budget(config):
+    """按配置设置全局请求速率上限，rate_budget为0时不限制"""
+    global budget
+    limit = float(config.get('rate_budget') or 0)
+    budget = RateBudget(limit) if limit > 0 else None
+    if budget:
+        print(f"全局请求速率上限: {limit:g} 次/秒")
+    return budget
+
+def create_controller(config):
+    """按配置创建自适应间隔控制器，未启用时返回None"""
+    if not config.get('adaptive_rate'):
+        return None
+    return AdaptiveInterval(
+        config['grab_interval'],
+        min_interval=config.get('min_interval', 0.3),
+        max_interval=config.get('max_interval', 5),
+        target_latency=config.get('target_latency', 0.8),
+    )
+
+def save_history(controllers, path='rate_history.csv'):
+    """
+    保存各课程最近的间隔变化(最多HISTORY_SIZE条)，并打印全程统计
+    :param controllers: {课程名: AdaptiveInterval}
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'course', 'interval', 'latency', 'code'])
+        for course_name, controller in controllers.items():
+            for timestamp, interval, latency, code in controller.history:
+                writer.writerow([
+                    f"{timestamp:.3f}", course_name, f"{interval:.3f}",
+                    '' if latency is None else f"{latency:.3f}", '' if code is None else code,
+                ])
+            low, avg, high = controller.summary()
+            print(f"[自适应间隔] {course_name}: 最小 {low:.2f}秒, 平均 {avg:.2f}秒, 最大 {high:.2f}秒")
+    print(f"间隔变化已保存到 {path}")
@@ -0,0 +1,151 @@
+"""
+在本地回放抓包文件，按记录的原始耗时返回当时的响应
+用法: python replay.py capture.jsonl.gz [--port 8766] [--speed 1] [--mode time|order]
+然后在config.yaml中设置 base_url: http://127.0.0.1:8766
+"""
+import argparse
+import json
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from capture import load_capture, parse_body
+
+# 区分同一接口不同请求的字段：选课按教学班，课程列表按页码、关键字和课程类型
+KEY_FIELDS = ('clazzId', 'pageNumber', 'KEY', 'teachingClassType')
+
+def request_key(path, body):
+    if isinstance(body, dict):
+        return (path,) + tuple(str(body.get(field, '')) for field in KEY_FIELDS)
+    return (path,)
+
+class ReplayState:
+    """
+    回放状态：把记录按接口和关键字段分组
+    :param mode: time按回放开始后经过的时间取当时的响应(如开放前返回未开始、开放后返回成功)，
+                 order按请求顺序依次返回，用完后重复最后一条
+    :param speed: 回放速度倍数，同时缩放时间轴和响应耗时
+    """
+
+    def __init__(self, entries, mode='time', speed=1.0):
+        self.mode = mode
+        self.speed = speed
+        self.groups = {}  # {请求关键字段: [记录]}
+        self.by_path = {}  # {接口: [记录]}，找不到相同关键字段时使用
+        for entry in entries:
+            if entry.get('status') is None:
+                # 超时、连接中断等失败的请求没有响应可以回放
+                continue
+            self.groups.setdefault(request_key(entry['path'], entry['body']), []).append(entry)
+            self.by_path.setdefault(entry['path'], []).append(entry)
+        self._times = {id(group): [entry['t'] for entry in group]
+                       for group in list(self.groups.values()) + list(self.by_path.values())}
+        self._cursor = {}
+        self.origin = None  # 回放时间轴的起点(本机时间)
+        self.counts = {}
+        self.first_success_at = None
+        self._lock = threading.Lock()
+
+    def lookup(self, path, body):
+        """找到本次请求应返回的记录，没有该接口的记录时返回None"""
+        group = self.groups.get(request_key(path, body)) or self.by_path.get(path)
+        if not group:
+            return None
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+            if self.origin is None:
+                # 第一个请求对齐到它对应的第一条记录
+                self.origin = time.time() - group[0]['t'] / self.speed
+            if self.mode == 'order':
+                index = self._cursor.get(id(group), 0)
+                self._cursor[id(group)] = min(index + 1, len(group) - 1)
+            else:
+                elapsed = (time.time() - self.origin) * self.speed
+                index = max(bisect_right(self._times[id(group)], elapsed) - 1, 0)
+            entry = group[index]
+            response = entry['response']
+            if (path.endswith('/clazz/add') and isinstance(response, dict)
+                    and response.get('code') == 200 and self.first_success_at is None):
+                self.first_success_at = time.time()
+            return entry
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        state = self.server.state
+        path = self.path.split('?')[0]
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        _, body = parse_body(raw, self.headers.get('Content-Type'))
+        entry = state.lookup(path, body)
+        if entry is None:
+            payload, status = {'code': 404, 'msg': '抓包中没有该接口的记录'}, 404
+        else:
+            payload, status = entry['response'], entry['status']
+            if entry.get('elapsed'):
+                time.sleep(entry['elapsed'] / state.speed)
+
+        if isinstance(payload, str):
+            data = payload.encode('utf-8')
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class ReplayServer:
+    """在后台线程中运行的回放服务器"""
+
+    def __init__(self, entries, host='127.0.0.1', port=0, mode='time', speed=1.0):
+        self.state = ReplayState(entries, mode, speed)
+        self.httpd = ThreadingHTTPServer((host, port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="回放抓包文件")
+    parser.add_argument("capture", help="抓包文件(capture_file)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--mode", choices=("time", "order"), default="time", help="按时间轴或按请求顺序取响应")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    args = parser.parse_args()
+
+    entries = load_capture(args.capture)
+    server = ReplayServer(entries, args.host, args.port, args.mode, args.speed)
+    print(f"已加载 {len(entries)} 条记录，回放服务器: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"请求统计: {server.state.counts}")
+
+if __name__ == "__main__":
+    main()
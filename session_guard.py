@@ -0,0 +1,77 @@
+import json
+import threading
+import client
+
+# 正在运行的抢课任务的会话守护，心跳线程发现会话过期时也交给它处理
+active_guard = None
+
+class SessionGuard:
+    """
+    会话守护：任一线程发现401时暂停所有发送线程，只重新登录一次，
+    然后替换全局会话中的cookies和Authorization，各线程保留自己的状态继续运行
+    """
+
+    def __init__(self, config, session_info, max_attempts=3, session_file='session_info.json'):
+        self.config = config
+        self.session_file = session_file
+        self.session_info = session_info
+        self.max_attempts = max_attempts
+        self.version = 0  # 每次换新会话加1
+        self.failed = False
+        self._ready = threading.Event()
+        self._ready.set()
+        self._lock = threading.Lock()
+
+    def wait_ready(self, timeout=None):
+        """重新登录期间阻塞，会话可用时返回True"""
+        return self._ready.wait(timeout)
+
+    def report_expired(self, seen_version):
+        """
+        报告会话过期
+        :param seen_version: 发现401的那次请求所用的会话版本，若会话已被其他线程刷新则不再重复登录
+        :return: 会话已恢复返回True，重新登录失败返回False
+        """
+        with self._lock:
+            if seen_version != self.version:
+                return not self.failed
+            if self.failed:
+                return False
+            self._ready.clear()
+            try:
+                self.failed = not self._relogin()
+            finally:
+                self._ready.set()
+            return not self.failed
+
+    def _relogin(self):
+        # 在函数内部导入，避免循环导入问题
+        from login import login
+
+        print("\n[会话恢复] 检测到会话过期，已暂停所有发送线程，开始重新登录")
+        if not self.config.get('captcha_ocr'):
+            # 所有发送线程都在等待，不能停下来等键盘输入验证码
+            print("[会话恢复] 未开启captcha_ocr，抢课中无法输入验证码，停止抢课")
+            return False
+        for attempt in range(1, self.max_attempts + 1):
+            # 识别失败时不回退到手动输入，直接换一张验证码重试
+            session_info = login({**self.config, 'headless': True})
+            if session_info:
+                session_info['batch_id'] = self.session_info.get('batch_id', '')
+                client.set_auth(session_info)
+                self.session_info.update(session_info)
+                self.version += 1
+                try:
+                    with open(self.session_file, 'w', encoding='utf-8') as f:
+                        json.dump(self.session_info, f, ensure_ascii=False, indent=2)
+                except Exception as e:
+                    print(f"[会话恢复] 保存会话信息失败: {str(e)}")
+                print("[会话恢复] 已更换会话，恢复所有发送线程")
+                return True
+            print(f"[会话恢复] 第{attempt}次重新登录失败")
+        print("[会话恢复] 重新登录失败，停止抢课")
+        return False
+
+def is_expired(result):
+    """请求结果是否表示会话过期"""
+    return result.status == 401 or result.code == 401
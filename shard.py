@@ -0,0 +1,268 @@
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import client
+import clock
+import rate
+import outcomes
+import metrics
+import log
+from choose import submit_course_tasks
+from prewarm import Prewarmer
+from targets import PreferenceChains, TargetSet
+
+# 分片进程向父进程上报统计的间隔(秒)
+STATS_INTERVAL = 0.5
+
+class RemoteGuard:
+    """
+    分片进程中的会话守护，接口与SessionGuard相同
+    发现会话过期时请父进程统一重新登录，等待父进程广播新的会话
+    """
+
+    def __init__(self, index, events):
+        self.index = index
+        self.events = events
+        self.version = 0
+        self.failed = False
+        self._ready = threading.Event()
+        self._ready.set()
+        self._lock = threading.Lock()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def report_expired(self, seen_version):
+        with self._lock:
+            if seen_version != self.version:
+                return not self.failed
+            if self.failed:
+                return False
+            # 本分片已在等待新会话时不再重复上报
+            if self._ready.is_set():
+                self._ready.clear()
+                self.events.put(('expired', self.index, seen_version))
+        self._ready.wait()
+        return not self.failed
+
+    def refreshed(self, session_info, version):
+        """父进程广播了新的会话"""
+        client.set_auth(session_info)
+        self.version = version
+        self._ready.set()
+
+    def give_up(self):
+        """父进程重新登录失败"""
+        self.failed = True
+        self._ready.set()
+
+class RemoteTargets:
+    """
+    分片进程中的互斥目标集合，抢到或放弃时通知父进程，由父进程决定停止哪些目标
+    同一课程的顺位班级在同一分片中，主抢和备选在本进程内切换
+    """
+
+    def __init__(self, index, events, course_list):
+        self.index = index
+        self.events = events
+        self.chains = PreferenceChains(course_list)
+        self._cancels = {}
+
+    def register(self, clazz_id, cancel):
+        self._cancels.setdefault(clazz_id, []).append(cancel)
+
+    def won(self, clazz_id):
+        self.events.put(('won', self.index, clazz_id))
+
+    def give_up(self, clazz_id, reason):
+        self.chains.remove(clazz_id)
+        self.events.put(('gave_up', self.index, clazz_id, reason))
+
+    def is_fallback(self, clazz_id):
+        return self.chains.is_fallback(clazz_id)
+
+    def report_full(self, clazz_id):
+        self.chains.mark_full(clazz_id)
+
+    def report_open(self, clazz_id):
+        self.chains.mark_open(clazz_id)
+
+    def cancel(self, clazz_id):
+        for cancel in self._cancels.get(clazz_id, []):
+            cancel()
+
+    def cancel_all(self):
+        for clazz_id in self._cancels:
+            self.cancel(clazz_id)
+
+def _listen(control, guard, targets):
+    """分片进程的控制线程，执行父进程广播的指令"""
+    while True:
+        message = control.get()
+        kind = message[0]
+        if kind == 'stop':
+            targets.cancel(message[1])
+        elif kind == 'auth':
+            guard.refreshed(message[1], message[2])
+        elif kind == 'auth_failed':
+            guard.give_up()
+            targets.cancel_all()
+        elif kind == 'shutdown':
+            targets.cancel_all()
+            return
+
+def _report(index, events, meter, table, done):
+    """定期把本分片的统计发给父进程"""
+    while not done.wait(STATS_INTERVAL):
+        events.put(('stats', index, meter.export()))
+    events.put(('stats', index, meter.export()))
+    events.put(('outcomes', index, dict(table.counts), dict(table.final)))
+
+def shard_main(index, course_list, session_info, headers, config, control, events):
+    """分片进程入口：用自己的连接池和线程池运行分到的课程"""
+    try:
+        client.init_client(config)
+        client.set_auth(session_info)
+        clock.offset = config.get('clock_offset', 0.0)
+        log.start(config)
+        meter = metrics.active = metrics.Metrics()
+        table = outcomes.create_table(config)
+        rate.create_budget(config)
+        guard = RemoteGuard(index, events)
+        targets = RemoteTargets(index, events, course_list)
+        threading.Thread(target=_listen, args=(control, guard, targets), daemon=True).start()
+        done = threading.Event()
+        reporter = threading.Thread(target=_report, args=(index, events, meter, table, done))
+        reporter.start()
+
+        scheduled_time = config.get('scheduled_time')
+        prewarmer = None
+        if scheduled_time and config.get('prewarm', True) and clock.now() < scheduled_time:
+            prewarmer = Prewarmer(config['max_workers'], interval=config.get('prewarm_interval', 5))
+            prewarmer.start(until=scheduled_time)
+        try:
+            with ThreadPoolExecutor(max_workers=config['max_workers']) as executor:
+                futures, _ = submit_course_tasks(
+                    executor, course_list, headers, config, None, guard, targets, table,
+                )
+                for future in futures:
+                    future.result()
+        finally:
+            if prewarmer:
+                prewarmer.stop()
+            done.set()
+            reporter.join()
+            log.stop()
+    finally:
+        events.put(('done', index))
+
+def shard_path(path, index):
+    """分片进程各自的日志或抓包文件: grab.log -> grab.shard0.log"""
+    if not path:
+        return path
+    if path.endswith('.gz'):
+        return f"{shard_path(path[:-3], index)}.gz"
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+def split_courses(course_list, shards):
+    """按轮转把课程分到各分片，同一课程的顺位班级放在同一分片，返回非空的分片"""
+    groups = {}
+    for course in course_list:
+        key = TargetSet.group_of(course) if course.get('rank') is not None else id(course)
+        groups.setdefault(key, []).append(course)
+    parts = [[] for _ in range(shards)]
+    for i, group in enumerate(groups.values()):
+        parts[i % shards].extend(group)
+    return [part for part in parts if part]
+
+def run_sharded(course_list, headers, config, guard, targets, table):
+    """
+    进程分片模式：把课程分到多个进程，每个进程有独立的连接池和请求循环
+    父进程负责：抢到后停止互斥目标、会话过期时统一重新登录并把新会话广播给所有分片、汇总统计
+    """
+    shards = int(config.get('shards') or 0) or os.cpu_count() or 1
+    parts = split_courses(course_list, max(1, min(shards, len(course_list))))
+    shards = len(parts)
+    shard_config = {
+        **config,
+        'base_url': client.BASE_URL,
+        'max_workers': max(1, math.ceil(config['max_workers'] / shards)),
+        'rate_budget': float(config.get('rate_budget') or 0) / shards,
+        'clock_offset': clock.offset,
+        'metrics_interval': 0,
+        'metrics_port': 0,
+    }
+    print(f"进程分片模式: {shards} 个进程, 每个进程并发数={shard_config['max_workers']}")
+
+    # spawn在各平台行为一致，子进程不继承父进程的线程和连接
+    context = multiprocessing.get_context('spawn')
+    events = context.Queue()
+    controls = [context.Queue() for _ in range(shards)]
+    for index, part in enumerate(parts):
+        for course in part:
+            clazz_id = course.get('clazzId')
+            # 互斥目标被放弃时通知它所在的分片停止
+            targets.register(
+                clazz_id, lambda clazz_id=clazz_id, index=index: controls[index].put(('stop', clazz_id)),
+            )
+
+    meter = metrics.create(config)
+    processes = []
+    for index, part in enumerate(parts):
+        part_config = {
+            **shard_config,
+            'log_file': shard_path(config.get('log_file'), index),
+            'capture_file': shard_path(config.get('capture_file'), index),
+        }
+        process = context.Process(
+            target=shard_main,
+            args=(index, part, guard.session_info, headers, part_config, controls[index], events),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+
+    snapshots = {}
+    running = set(range(shards))
+    try:
+        while running:
+            try:
+                message = events.get(timeout=1)
+            except queue.Empty:
+                # 分片进程异常退出时不再等待它
+                for index in list(running):
+                    if not processes[index].is_alive():
+                        print(f"[进程分片] 分片{index}已退出(退出码 {processes[index].exitcode})")
+                        running.discard(index)
+                continue
+
+            kind, index = message[0], message[1]
+            if kind == 'won':
+                targets.won(message[2])
+            elif kind == 'gave_up':
+                targets.give_up(message[2], message[3])
+            elif kind == 'expired':
+                # 只重新登录一次，然后把新会话广播给所有分片
+                if guard.report_expired(message[2]):
+                    for control in controls:
+                        control.put(('auth', dict(guard.session_info), guard.version))
+                else:
+                    for control in controls:
+                        control.put(('auth_failed',))
+            elif kind == 'stats':
+                snapshots[index] = message[2]
+                meter.load(snapshots.values())
+            elif kind == 'outcomes':
+                table.merge(message[2], message[3])
+            elif kind == 'done':
+                running.discard(index)
+    finally:
+        for control in controls:
+            control.put(('shutdown',))
+        for process in processes:
+            process.join(timeout=5)
+        metrics.close(meter)
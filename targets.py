@@ -0,0 +1,236 @@
+import re
+import threading
+
+WEEKDAYS = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '日': 7, '天': 7}
+SLOT_PATTERN = re.compile(r'星期([一二三四五六日天])\s*第?(\d+)(?:-(\d+))?节')
+WEEK_PATTERN = re.compile(r'([\d,，\-]+)周')
+ALL_WEEKS = frozenset(range(1, 31))
+
+def parse_weeks(text):
+    """解析文本中最后一处"1-8,10-16周"之类的周次，没有周次信息时视为全部周"""
+    found = WEEK_PATTERN.findall(text)
+    if not found:
+        return ALL_WEEKS
+    weeks = set()
+    for match in re.finditer(r'(\d+)(?:-(\d+))?', found[-1]):
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        weeks.update(range(start, end + 1))
+    return frozenset(weeks) or ALL_WEEKS
+
+def parse_slots(teaching_place):
+    """
+    从教室及时间中解析上课时段
+    :return: [(星期, 开始节次, 结束节次, 周次集合)]，无法解析时为空列表
+    """
+    slots = []
+    for segment in re.split(r'[;；\n]', teaching_place or ''):
+        for match in SLOT_PATTERN.finditer(segment):
+            # 周次写在星期之前
+            weeks = parse_weeks(segment[:match.start()])
+            start = int(match.group(2))
+            end = int(match.group(3) or start)
+            slots.append((WEEKDAYS[match.group(1)], start, end, weeks))
+    return slots
+
+def slots_overlap(a, b):
+    """两组上课时段是否冲突"""
+    return any(
+        day_a == day_b and start_a <= end_b and start_b <= end_a and weeks_a & weeks_b
+        for day_a, start_a, end_a, weeks_a in a
+        for day_b, start_b, end_b, weeks_b in b
+    )
+
+class PreferenceChains:
+    """
+    同一课程按顺位(课程文件中的rank)选择的多个教学班组成一条链，链始终按顺位排序
+    未满的班级中顺位最高的为主抢班级，其余为备选班级，只以低频率发送；
+    全部已满时仍由顺位最高的班级主抢，已满的班级再报告其他结果(如监视到空位)时恢复原来的顺位
+    """
+
+    def __init__(self, course_list):
+        self.chains = {}  # {课程: [教学班ID]}，按顺位排序
+        ranked = sorted((course for course in course_list if course.get('rank') is not None),
+                        key=lambda course: int(course['rank']))
+        for course in ranked:
+            self.chains.setdefault(TargetSet.group_of(course), []).append(course.get('clazzId'))
+        # 只有一个班级时无需区分主抢和备选
+        self.chain_of = {
+            clazz_id: chain
+            for chain in self.chains.values() if len(chain) > 1
+            for clazz_id in chain
+        }
+        self.full = set()  # 最近一次报告已满的班级
+        self._heads = {id(chain): chain[0] for chain in self.chain_of.values()}  # {链: 主抢班级}
+        self._lock = threading.Lock()
+
+    def _head(self, chain):
+        """未满的班级中顺位最高的，全部已满时为顺位最高的"""
+        return next((clazz_id for clazz_id in chain if clazz_id not in self.full), chain[0])
+
+    def _update(self, chain):
+        """
+        重新确定主抢班级
+        :return: 主抢班级有变化时返回新的主抢班级，否则返回None
+        """
+        head = self._head(chain) if chain else None
+        changed = head != self._heads.get(id(chain))
+        self._heads[id(chain)] = head
+        return head if changed else None
+
+    def is_fallback(self, clazz_id):
+        chain = self.chain_of.get(clazz_id)
+        return bool(chain) and self._heads[id(chain)] != clazz_id
+
+    def mark_full(self, clazz_id):
+        """
+        班级已满，由未满的班级中顺位最高的接替
+        :return: 主抢班级有变化时返回新的主抢班级，否则返回None
+        """
+        chain = self.chain_of.get(clazz_id)
+        if not chain or clazz_id in self.full:
+            return None
+        with self._lock:
+            self.full.add(clazz_id)
+            return self._update(chain)
+
+    def mark_open(self, clazz_id):
+        """
+        已满的班级报告了其他结果，恢复它的顺位
+        :return: 主抢班级有变化时返回新的主抢班级，否则返回None
+        """
+        # 大多数响应走这里，不在已满集合中时直接返回
+        if clazz_id not in self.full:
+            return None
+        with self._lock:
+            self.full.discard(clazz_id)
+            chain = self.chain_of.get(clazz_id)
+            return self._update(chain) if chain else None
+
+    def remove(self, clazz_id):
+        """
+        班级离开链(无法选上或已被放弃)
+        :return: 主抢班级有变化时返回新的主抢班级，否则返回None
+        """
+        with self._lock:
+            chain = self.chain_of.pop(clazz_id, None)
+            if not chain:
+                return None
+            chain.remove(clazz_id)
+            self.full.discard(clazz_id)
+            return self._update(chain)
+
+class TargetSet:
+    """
+    互斥的抢课目标集合
+    同一课程(课程号相同)的多个教学班、上课时间冲突的教学班互斥，
+    其中一个抢到后立即放弃其余的，把请求留给仍在抢的课程
+    """
+
+    def __init__(self, course_list):
+        self.courses = {course.get('clazzId'): course for course in course_list}
+        self.slots = {
+            clazz_id: parse_slots(course.get('teachingPlace'))
+            for clazz_id, course in self.courses.items()
+        }
+        self.open = set(self.courses)
+        self.chains = PreferenceChains(course_list)
+        self.won_ids = set()
+        self.retired = {}  # {教学班ID: 放弃原因}
+        self._cancels = {}  # {教学班ID: [取消回调]}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group_of(course):
+        """
+        同组的教学班属于同一门课程，旧的课程文件没有课程号时按课程名判断，
+        两者都没有时无法判断，每个教学班自成一组
+        """
+        return course.get('courseCode') or course.get('courseName') or course.get('clazzId') or course.get('JXBID')
+
+    def register(self, clazz_id, cancel):
+        """登记停止某个目标的回调，同一目标可有多个发送者"""
+        self._cancels.setdefault(clazz_id, []).append(cancel)
+
+    def is_open(self, clazz_id):
+        return clazz_id in self.open
+
+    def is_fallback(self, clazz_id):
+        """是否为顺位链中的备选班级"""
+        return self.chains.is_fallback(clazz_id)
+
+    def _promoted(self, clazz_id, reason):
+        print(f"[顺位] {self.courses[clazz_id].get('courseName', '未知课程')} {reason}，"
+              f"改为主抢 {self.courses[clazz_id].get('teacher', '')} ({clazz_id})")
+
+    def report_full(self, clazz_id):
+        """班级已满，主抢班级由未满的班级中顺位最高的接替"""
+        promoted = self.chains.mark_full(clazz_id)
+        if promoted is not None and promoted != clazz_id:
+            self._promoted(promoted, "全部班级已满" if promoted in self.chains.full else "主抢班级已满")
+
+    def report_open(self, clazz_id):
+        """班级报告了已满以外的结果(或监视到空位)，顺位更高时重新成为主抢班级"""
+        promoted = self.chains.mark_open(clazz_id)
+        if promoted is not None:
+            self._promoted(promoted, "顺位更高的班级不再已满")
+
+    def exclusive_with(self, clazz_id):
+        """与该目标互斥的其他目标及原因"""
+        course = self.courses[clazz_id]
+        result = {}
+        for other_id, other in self.courses.items():
+            if other_id == clazz_id:
+                continue
+            if self.group_of(other) == self.group_of(course):
+                result[other_id] = f"已抢到同一课程的其他班级 {course.get('teacher', '')}"
+            elif slots_overlap(self.slots[clazz_id], self.slots[other_id]):
+                result[other_id] = f"与已抢到的 {course.get('courseName', '')} 上课时间冲突"
+        return result
+
+    def won(self, clazz_id):
+        """
+        记录抢到的目标，并放弃所有因此变得多余或冲突的目标
+        :return: 本次放弃的教学班ID列表
+        """
+        with self._lock:
+            if clazz_id not in self.open:
+                return []
+            self.open.discard(clazz_id)
+            self.won_ids.add(clazz_id)
+            retired = []
+            for other_id, reason in self.exclusive_with(clazz_id).items():
+                if other_id not in self.open:
+                    continue
+                self.open.discard(other_id)
+                self.retired[other_id] = reason
+                retired.append(other_id)
+
+        for other_id in retired:
+            print(f"[放弃] {self.courses[other_id].get('courseName', '未知课程')} - {self.retired[other_id]}")
+            for cancel in self._cancels.get(other_id, []):
+                cancel()
+        return retired
+
+    def give_up(self, clazz_id, reason):
+        """放弃无法选上的目标，停止它的所有发送者"""
+        with self._lock:
+            if clazz_id not in self.open:
+                return
+            self.open.discard(clazz_id)
+            self.retired[clazz_id] = reason
+
+        print(f"[放弃] {self.courses[clazz_id].get('courseName', '未知课程')} - {reason}")
+        promoted = self.chains.remove(clazz_id)
+        if promoted is not None:
+            self._promoted(promoted, "主抢班级无法选上")
+        for cancel in self._cancels.get(clazz_id, []):
+            cancel()
+
+    def retired_files(self):
+        """被放弃目标的课程文件"""
+        return [
+            self.courses[clazz_id].get('file_path')
+            for clazz_id in self.retired
+            if self.courses[clazz_id].get('file_path')
+        ]
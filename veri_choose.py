@@ -1,4 +1,4 @@
-import requests
+import client
 import json
 import os
 
@@ -14,20 +14,14 @@ def verify_session():
         print(f"[会话验证] 加载会话信息失败: {str(e)}")
         return False
     
-    cookies = session_info.get('cookies', {})
-    authorization = session_info.get('Authorization', '')
+    client.set_auth(session_info)
     batch_id = session_info.get('batch_id', '')
     
     # 构建请求头
     headers = {
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6',
-        'Authorization': authorization,
-        'Connection': 'keep-alive',
         'Content-Type': 'application/x-www-form-urlencoded',
-        'Origin': 'http://jwxk.ctgu.edu.cn',
-        'Referer': f'http://jwxk.ctgu.edu.cn/xsxk/elective/grablessons?batchId={batch_id}',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+        'Origin': client.BASE_URL,
+        'Referer': client.url(f'/xsxk/elective/grablessons?batchId={batch_id}'),
         'X-Requested-With': 'XMLHttpRequest',
         'batchId': batch_id,
     }
@@ -60,12 +54,10 @@ def verify_session():
     
     try:
         print(f"[会话验证] 发送测试请求...")
-        response = requests.post(
-            'http://jwxk.ctgu.edu.cn/xsxk/elective/clazz/add',
-            cookies=cookies,
+        response = client.post(
+            '/xsxk/elective/clazz/add',
             headers=headers,
             data=test_data,
-            verify=False,
         )
         
         # 打印完整响应
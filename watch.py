@@ -0,0 +1,136 @@
+import threading
+import time
+import client
+import clock
+from catalog import Catalog, free_seats
+
+class SeatWatcher:
+    """
+    余量监视：定期查询目标教学班的已选人数，只在出现空位时放行选课请求
+    每门课程按课程名搜索(clazz/list的KEY参数)，只取少量记录，比逐个发送clazz/add轻得多
+    """
+
+    def __init__(self, course_list, batch_id, config, session=None):
+        self.campus = config.get('campus', '01')
+        self.interval = config.get('watch_interval', 1)
+        self.burst = max(1, int(config.get('watch_burst', 3)))
+        self.grab_interval = config['grab_interval']
+        self.session = session  # 多账号模式下该账号的会话
+        self.headers = {
+            'Content-Type': 'application/json;charset=UTF-8',
+            'Origin': client.BASE_URL,
+            'Referer': client.url(f'/xsxk/elective/grablessons?batchId={batch_id}'),
+        }
+        # 按(课程类型, 课程名)分组，同名课程的多个教学班只查询一次
+        self.queries = {}
+        for course in course_list:
+            key = (course.get('clazzType', 'FANKC'), course.get('courseName', ''))
+            self.queries.setdefault(key, set()).add(course.get('clazzId'))
+        self.seats = {}  # {教学班ID: (已选人数, 课容量)}
+        self._events = {course.get('clazzId'): threading.Event() for course in course_list}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.polls = 0
+        self.attempts = 0
+        self.started_at = None
+
+    def _query(self, clazz_type, course_name):
+        response = client.post(
+            '/xsxk/elective/clazz/list',
+            headers=self.headers,
+            json={
+                'teachingClassType': clazz_type,
+                'pageNumber': 1,
+                'pageSize': 10,
+                'orderBy': '',
+                'campus': self.campus,
+                'KEY': course_name,
+            },
+        )
+        data = response.json()
+        if data.get('code') != 200:
+            raise RuntimeError(data.get('msg', '未知错误'))
+        return Catalog.from_rows(data.get('data', {}).get('rows', []))
+
+    def poll_once(self):
+        """查询一轮所有目标教学班，有空位的教学班放行"""
+        for (clazz_type, course_name), clazz_ids in self.queries.items():
+            try:
+                catalog = self._query(clazz_type, course_name)
+            except Exception as e:
+                # 查询失败时无法判断余量，放行该组教学班，退化为普通轮询
+                print(f"[余量监视] 查询 {course_name} 失败: {e}")
+                for clazz_id in clazz_ids:
+                    self._events[clazz_id].set()
+                continue
+            finally:
+                with self._lock:
+                    self.polls += 1
+
+            for clazz_id in clazz_ids:
+                entry = catalog.get_class(clazz_id)
+                if entry is None:
+                    # 搜索结果中没有该班级，同样放行
+                    self._events[clazz_id].set()
+                    continue
+                class_info = entry[1]
+                previous = self.seats.get(clazz_id)
+                self.seats[clazz_id] = (class_info.get('YXRS'), class_info.get('KRL'))
+                if free_seats(class_info) > 0:
+                    if not self._events[clazz_id].is_set():
+                        print(f"[余量监视] {course_name} 出现空位: "
+                              f"已选 {class_info.get('YXRS')}/{class_info.get('KRL')}"
+                              + (f" (之前 {previous[0]}/{previous[1]})" if previous else ""))
+                    self._events[clazz_id].set()
+
+    def _loop(self, start_at):
+        if self.session is not None:
+            client.use_session(self.session)
+        # 开抢前选课列表不可用，到预定时间再开始查询
+        if start_at:
+            self._stop.wait(max(start_at - clock.now(), 0))
+        while not self._stop.is_set():
+            self.poll_once()
+            self._stop.wait(self.interval)
+
+    def start(self, start_at=None):
+        """启动监视线程，提供start_at时从该服务器时间开始查询"""
+        self.started_at = max(time.time(), (start_at or 0) - clock.offset)
+        self._thread = threading.Thread(target=self._loop, args=(start_at,), daemon=True)
+        self._thread.start()
+        print(f"[余量监视] 已启动，监视 {len(self._events)} 个教学班，查询间隔 {self.interval}秒")
+        return self._thread
+
+    def stop(self):
+        """停止监视并打印请求统计"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.report()
+
+    def wait_for_seat(self, clazz_id, timeout=None):
+        """
+        等待教学班出现空位
+        :return: 有空位时返回True并重置等待状态，超时返回False
+        """
+        event = self._events[clazz_id]
+        if event.wait(timeout):
+            event.clear()
+            return True
+        return False
+
+    def record_attempt(self):
+        """记录一次clazz/add请求"""
+        with self._lock:
+            self.attempts += 1
+
+    def report(self):
+        """对比盲目轮询估算节省的请求数"""
+        if self.started_at is None:
+            return
+        elapsed = max(time.time() - self.started_at, 0)
+        blind = int(elapsed / self.grab_interval) * len(self._events)
+        used = self.attempts + self.polls
+        print(f"[余量监视] 运行 {elapsed:.0f}秒: 选课请求 {self.attempts} 次, 查询 {self.polls} 次; "
+              f"盲目轮询约需 {blind} 次, 节省 {max(blind - used, 0)} 次")